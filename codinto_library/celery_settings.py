@@ -5,5 +5,17 @@ CELERY_BEAT_SCHEDULE = {
     'check_legal_borrow_date': {
         'task': 'library.tasks.check_legal_borrow_date',
         'schedule':  crontab(hour=0, minute=0),  # This runs every day at midnight (00:00)
-    }
-}
\ No newline at end of file
+    },
+    'refresh_book_counters': {
+        'task': 'library.tasks.refresh_book_counters',
+        'schedule': crontab(hour=3, minute=0),  # Reconciles the denormalized book counters every night
+    },
+    'expire_hold_offers': {
+        'task': 'library.tasks.expire_hold_offers',
+        'schedule': crontab(minute='*/5'),  # Passes unclaimed hold offers on to the next user in the queue
+    },
+    'dispatch_outbox': {
+        'task': 'library.tasks.dispatch_outbox_task',
+        'schedule': crontab(),  # Picks up events whose commit-time kick was lost, every minute
+    },
+}
@@ -0,0 +1,44 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return ordering
+        field_names = {field.name for field in queryset.model._meta.get_fields()}
+        return self.ordering if 'created_at' in field_names else ('-id',)
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """
+    Page number pagination by default, keyset pagination over (created_at, id) when the client
+    sends ?pagination=cursor or follows a ?cursor= link. Keyset pages skip the COUNT(*) and the
+    deep OFFSET of page number pages. Querysets a filter has re-ordered (search rank, similarity,
+    filter_type) keep page numbers, since keyset pages would return them in date order.
+    """
+    cursor_pagination_class = KeysetPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        wants_cursor = 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor'
+        if wants_cursor and self.keeps_view_ordering(queryset, view):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    @staticmethod
+    def keeps_view_ordering(queryset, view):
+        if view is None or not queryset.query.order_by:
+            return True
+        return tuple(queryset.query.order_by) == tuple(view.get_queryset().query.order_by)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
 
     # third party
@@ -153,3 +154,9 @@ SIMPLE_JWT_CONFIG = SIMPLE_JWT
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Texts users about accepted/rejected requests when the outbox dispatcher processes them
+REQUEST_DECISION_SMS = config('REQUEST_DECISION_SMS', default=False, cast=bool)
+
+# How long a copy offered to the next user in a book's hold queue stays reserved for them
+HOLD_OFFER_HOURS = config('HOLD_OFFER_HOURS', default=24, cast=int)
@@ -1,6 +1,9 @@
 from melipayamak import Api
 from decouple import config
 
+# The SendSMS endpoint accepts up to 100 comma separated recipients per call
+SMS_RECIPIENTS_PER_REQUEST = 100
+
 
 def send_sms(number, message):
     username = config('SMS_USERNAME')
@@ -17,3 +20,7 @@ def send_sms(number, message):
         return response
     except Exception as e:
         return str(e)
+
+
+def send_bulk_sms(numbers, message):
+    return send_sms(','.join(numbers), message)
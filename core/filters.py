@@ -0,0 +1,13 @@
+from rest_framework.filters import SearchFilter
+
+from core.normalizers import normalize_persian
+
+
+class NormalizedSearchFilter(SearchFilter):
+    """
+    SearchFilter that normalizes the query the same way the stored search keys are normalized.
+    """
+
+    def get_search_terms(self, request):
+        params = request.query_params.get(self.search_param, '')
+        return normalize_persian(params).split()
@@ -1,5 +1,8 @@
-from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models
+
+from core.normalizers import normalize_persian
 
 
 # Create your models here.
@@ -21,7 +24,24 @@ class Profile(BaseModel, AbstractUser):
     email = models.EmailField(max_length=255, verbose_name="ایمیل")
     telegram_id = models.CharField(max_length=255, verbose_name="آیدی تلگرام")
     picture = models.ImageField(upload_to='uploads/', verbose_name='آواتار')
+    search_key = models.TextField(blank=True, default='', editable=False, verbose_name="کلید جستجو")
+
+    SEARCH_KEY_FIELDS = ['username', 'first_name', 'last_name', 'email', 'phone_number', 'telegram_id']
 
     class Meta:
         verbose_name = "پروفایل"
-        verbose_name_plural = "پروفایل ها"
\ No newline at end of file
+        verbose_name_plural = "پروفایل ها"
+        indexes = [
+            # Substring search over the normalized key in the admin user search
+            GinIndex(OpClass('search_key', name='gin_trgm_ops'), name='profile_search_key_trgm_idx'),
+        ]
+
+    def build_search_key(self):
+        return normalize_persian(' '.join(getattr(self, field) or '' for field in self.SEARCH_KEY_FIELDS))
+
+    def save(self, *args, **kwargs):
+        self.search_key = self.build_search_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.SEARCH_KEY_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'search_key'}
+        super().save(*args, **kwargs)
\ No newline at end of file
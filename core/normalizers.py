@@ -0,0 +1,40 @@
+import re
+
+CHARACTER_MAP = str.maketrans({
+    # Arabic letters typed on Arabic keyboards -> Persian letters
+    'ي': 'ی',
+    'ى': 'ی',
+    'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'ؤ': 'و',
+    'أ': 'ا',
+    'إ': 'ا',
+    'ٱ': 'ا',
+    # Persian and Arabic-Indic digits -> Latin digits
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    # Zero width non-joiner/joiner and other invisible separators behave like a space
+    '\u200c': ' ',
+    '\u200d': ' ',
+    '\u200e': ' ',
+    '\u200f': ' ',
+    '\u00a0': ' ',
+    # Tatweel is pure decoration
+    '\u0640': None,
+})
+
+DIACRITICS = re.compile('[\u064b-\u065f\u0670]')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_persian(text):
+    """
+    Folds the spelling variants users mix when typing Persian text into one canonical form,
+    so stored search keys and incoming queries compare equal.
+    """
+    if not text:
+        return ''
+    text = DIACRITICS.sub('', str(text).translate(CHARACTER_MAP))
+    return WHITESPACE.sub(' ', text).strip().casefold()
@@ -0,0 +1,21 @@
+from core.normalizers import normalize_persian
+
+
+class TestNormalizePersian:
+    def test_if_arabic_letters_are_folded_to_persian(self):
+        assert normalize_persian('كتاب علي') == normalize_persian('کتاب علی')
+
+    def test_if_digits_are_folded_to_latin(self):
+        assert normalize_persian('۱۴۰۲ و ١٤٠٢') == '1402 و 1402'
+
+    def test_if_zwnj_and_repeated_spaces_become_single_space(self):
+        assert normalize_persian('کتاب‌ها') == normalize_persian('کتاب   ها') == 'کتاب ها'
+
+    def test_if_diacritics_and_tatweel_are_removed(self):
+        assert normalize_persian('مُحَمَّد کتـــاب') == 'محمد کتاب'
+
+    def test_if_latin_text_is_case_folded(self):
+        assert normalize_persian('  Hello World ') == 'hello world'
+
+    def test_if_empty_values_return_empty_string(self):
+        assert normalize_persian(None) == ''
@@ -165,6 +165,24 @@ class TestGetInSuperUserSearch:
 
         assert response.status_code == status.HTTP_200_OK
 
+    def test_if_arabic_spelling_finds_persian_profile(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        profile = baker.make(Profile, first_name='علی', last_name='کاظمی', phone_number='۰۹۱۲۳۴۵۶۷۸۹')
+
+        response = api_client.get('/super-user/search-users/', {'search': 'علي كاظمي'})
+        by_phone = api_client.get('/super-user/search-users/', {'search': '09123456789'})
+
+        assert [user['id'] for user in response.data['results']] == [profile.id]
+        assert [user['id'] for user in by_phone.data['results']] == [profile.id]
+
+    def test_if_search_ignores_case_within_words(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        profile = baker.make(Profile, username='NightReader', email='reader@example.com')
+
+        response = api_client.get('/super-user/search-users/', {'search': 'tread'})
+
+        assert [user['id'] for user in response.data['results']] == [profile.id]
+
 
 @pytest.mark.django_db
 class TestRetrieveUserDetail:
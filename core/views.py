@@ -4,6 +4,7 @@ from rest_framework.permissions import AllowAny, IsAdminUser
 from django.db import transaction
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 
+from .filters import NormalizedSearchFilter
 from .permissions import IsNotSelf
 from .utils import black_list_refresh_token, get_access_from_refresh
 from core.serializers.registration_serializers import LoginSerializer, RefreshSerializer
@@ -97,8 +98,10 @@ class ProfileUpdateView(mixins.RetrieveModelMixin,
 class SearchUserView(ListAPIView):
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
-    search_fields = ['username', 'first_name', 'last_name', 'email', 'phone_number', 'telegram_id']
-    queryset = Profile.objects.all()
+    filter_backends = [NormalizedSearchFilter]
+    # The key is stored casefolded, so a case-sensitive LIKE matches and can use the trigram index
+    search_fields = ['search_key__contains']
+    queryset = Profile.objects.order_by('id')
 
 
 class AdminListProfileView(ListAPIView, CreateAPIView):
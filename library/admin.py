@@ -1,6 +1,6 @@
 from django.contrib import admin
 from library.models import Category, Book, ReviewRequest, Notification, BorrowRequest, ExtensionRequest, ReviewRequest, \
-    History, ReturnRequest, BaseRequestModel
+    History, ReturnRequest, BaseRequestModel, ActiveLoan, OutboxEvent, BookHold
 
 # Register your models here.
 admin.site.register(Category)
@@ -12,3 +12,6 @@ admin.site.register(ExtensionRequest)
 admin.site.register(ReturnRequest)
 admin.site.register(History)
 admin.site.register(BaseRequestModel)
+admin.site.register(ActiveLoan)
+admin.site.register(OutboxEvent)
+admin.site.register(BookHold)
@@ -0,0 +1,147 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from library.loaders import load_request_subtypes
+from library.loans import close_loans, extend_loans, loan_pairs, open_loans
+from library.models import ActiveLoan, BaseRequestModel, Book, BookHold, BorrowRequest, Category, ExtensionRequest
+from library.outbox import emit, request_decided_event
+from library.signals import invalidate_on_commit
+from library.holds import BOOK_RESERVED, fulfil_holds, schedule_offers
+from library.workflow import BOOK_UNAVAILABLE, request_workflow
+
+REQUEST_NOT_FOUND = '! درخواست یافت نشد'
+BOOK_ALREADY_HELD = '! کاربر این کتاب را در اختیار دارد'
+
+
+def per_book(field, deltas):
+    return F(field) + Case(
+        *[When(id=book_id, then=Value(delta)) for book_id, delta in deltas.items()],
+        default=Value(0),
+    )
+
+
+@transaction.atomic
+def apply_request_decisions(decisions):
+    """
+    Accepts or rejects many requests at once. `decisions` maps request ids to the target status.
+    Every item is validated against the locked rows first; the valid ones are then applied with a
+    fixed number of statements however many requests there are, and the per-item outcome is returned.
+    """
+    requests = {
+        request.id: request for request in BaseRequestModel.objects.select_for_update(of=('self',)).select_related(
+            'user', 'book').filter(id__in=decisions)
+    }
+    load_request_subtypes(list(requests.values()))
+    book_ids = {request.book_id for request in requests.values()}
+    books = {
+        book_id: (count, category_id) for book_id, count, category_id in
+        Book.objects.select_for_update().filter(id__in=book_ids).values_list('id', 'count', 'category_id')
+    }
+    available = {book_id: count for book_id, (count, category_id) in books.items()}
+    holders = set(ActiveLoan.objects.filter(
+        user_id__in={request.user_id for request in requests.values()}, book_id__in=book_ids,
+    ).values_list('user_id', 'book_id'))
+    offers = defaultdict(set)
+    for user_id, book_id in BookHold.objects.filter(book_id__in=book_ids, status='offered').values_list(
+            'user_id', 'book_id'):
+        offers[book_id].add(user_id)
+
+    results = []
+    decided = []
+    for request_id, status in decisions.items():
+        request = requests.get(request_id)
+        error = validate_decision(request, status, available, holders, offers)
+        if error:
+            results.append({'id': request_id, 'success': False, 'error': error})
+            continue
+        if status == 'accepted' and request.type == 'borrow':
+            available[request.book_id] -= 1
+            holders.add((request.user_id, request.book_id))
+            offers[request.book_id].discard(request.user_id)
+        request.status = status
+        decided.append(request)
+        results.append({'id': request_id, 'success': True, 'status': status})
+
+    if decided:
+        apply_decided(decided, books)
+    return results
+
+
+def validate_decision(request, status, available, holders, offers):
+    if request is None:
+        return REQUEST_NOT_FOUND
+    error = request_workflow.check(request, status)
+    if error:
+        return error
+    if request.type == 'borrow' and status == 'accepted':
+        if (request.user_id, request.book_id) in holders:
+            return BOOK_ALREADY_HELD
+        if available.get(request.book_id, 0) <= 0:
+            return BOOK_UNAVAILABLE
+        if available[request.book_id] - len(offers[request.book_id] - {request.user_id}) <= 0:
+            return BOOK_RESERVED
+    return None
+
+
+def apply_decided(decided, books):
+    now = timezone.now()
+    accepted = [request for request in decided if request.status == 'accepted']
+    by_type = defaultdict(list)
+    for request in accepted:
+        by_type[request.type].append(request)
+
+    for status in ('accepted', 'rejected'):
+        ids = [request.id for request in decided if request.status == status]
+        if ids:
+            BaseRequestModel.objects.filter(id__in=ids).update(status=status, updated_at=now)
+
+    borrows = [request.borrowrequest for request in by_type['borrow']]
+    for borrow in borrows:
+        borrow.duration = borrow.time
+        borrow.start_date = now
+        borrow.end_date = now + timezone.timedelta(days=borrow.time)
+    BorrowRequest.objects.bulk_update(borrows, ['duration', 'start_date', 'end_date'])
+    open_loans(borrows)
+    fulfil_holds(borrows)
+
+    extensions = [request.extensionrequest for request in by_type['extension']]
+    for extension in extensions:
+        extension.duration = extension.time
+    ExtensionRequest.objects.bulk_update(extensions, ['duration'])
+    extend_loans(extensions)
+
+    if by_type['return']:
+        BorrowRequest.objects.filter(loan_pairs(by_type['return']), is_finished=False).update(
+            end_date=now, is_finished=True)
+        close_loans(by_type['return'])
+
+    update_books(by_type, books)
+    emit([request_decided_event(request) for request in decided])
+    invalidate_on_commit('home', 'books', *{f'book:{request.book_id}' for request in decided})
+
+
+def update_books(by_type, books):
+    borrows = Counter(request.book_id for request in by_type['borrow'])
+    returns = Counter(request.book_id for request in by_type['return'])
+
+    count_deltas = {book_id: returns[book_id] - borrows[book_id] for book_id in borrows | returns}
+    loan_deltas = {book_id: -delta for book_id, delta in count_deltas.items()}
+    if not count_deltas:
+        return
+
+    Book.objects.filter(id__in=count_deltas).update(
+        count=per_book('count', count_deltas),
+        borrow_count=per_book('borrow_count', borrows),
+        active_loan_count=Greatest(per_book('active_loan_count', loan_deltas), 0),
+    )
+
+    copies_by_category = Counter()
+    for book_id, delta in count_deltas.items():
+        count, category_id = books[book_id]
+        copies_by_category[category_id] += delta
+    Category.shift_available_totals(copies_by_category)
+    schedule_offers(book_id for book_id, delta in count_deltas.items() if delta > 0)
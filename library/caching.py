@@ -0,0 +1,113 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+IDEMPOTENCY_TIMEOUT = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def tag_version_key(tag):
+    return f'cache-tag:{tag}'
+
+
+def get_tag_versions(tags):
+    keys = [tag_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh version (instead of starting from 1) keeps evicted tags from resurrecting old entries
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    cache.set_many({tag_version_key(tag): time.time_ns() for tag in tags}, timeout=None)
+
+
+def cache_response(*tags, timeout=RESPONSE_CACHE_TIMEOUT):
+    """
+    Caches successful responses of a view handler under the given tags.
+    Tags may use the url kwargs as format fields, e.g. 'book:{pk}'.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            view_tags = [tag.format(**kwargs) for tag in tags]
+            versions = '.'.join(str(version) for version in get_tag_versions(view_tags))
+            key = f'response:{request.get_full_path()}:{versions}'
+
+            cached = cache.get(key)
+            if cached is not None:
+                return Response(cached, status=status.HTTP_200_OK)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def idempotent(timeout=IDEMPOTENCY_TIMEOUT):
+    """
+    Lets clients retry a POST safely by sending an Idempotency-Key header. The first successful
+    response is stored per user, path and key, and later requests with the same key get it back
+    without running the handler. A retry that arrives while the first attempt is still running
+    gets 409, and reusing a key with a different body gets 422.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not idempotency_key:
+                return view_method(self, request, *args, **kwargs)
+            if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return Response({'detail': '! کلید یکتایی درخواست بیش از حد طولانی است'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            key = f'idempotency:{request.user.pk}:{request.path}:{hashlib.md5(idempotency_key.encode()).hexdigest()}'
+            fingerprint = hashlib.md5(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+
+            # The placeholder doubles as a lock: only the request that adds it runs the handler
+            if cache.add(key, {'fingerprint': fingerprint}, IDEMPOTENCY_LOCK_TIMEOUT):
+                try:
+                    response = view_method(self, request, *args, **kwargs)
+                except Exception:
+                    cache.delete(key)
+                    raise
+                if status.is_success(response.status_code):
+                    cache.set(key, {
+                        'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data,
+                    }, timeout)
+                else:
+                    # Failed attempts are not stored, so the client can fix the request and retry
+                    cache.delete(key)
+                return response
+
+            stored = cache.get(key) or {}
+            if stored.get('fingerprint', fingerprint) != fingerprint:
+                return Response({'detail': '! این کلید یکتایی قبلا برای درخواست دیگری استفاده شده است'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if 'status' not in stored:
+                return Response({'detail': '! درخواست قبلی با این کلید یکتایی هنوز در حال انجام است'},
+                                status=status.HTTP_409_CONFLICT)
+            response = Response(stored['data'], status=stored['status'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        return wrapper
+
+    return decorator
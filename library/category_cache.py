@@ -0,0 +1,107 @@
+import threading
+
+from django.core.cache import cache
+
+from library.caching import get_tag_versions
+from library.hierarchy import build_category_tree
+from library.models import Category
+
+CATEGORY_TREE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class CategoryTreeCache:
+    """
+    Serializes the structure of the category tree once per 'categories' cache tag version, and
+    the book totals once per 'category-totals' version. Borrows and returns only move the totals,
+    so they leave the tree blob in place. Both are shared through the cache backend and kept in
+    process memory, so a warm process answers with a single cache lookup for the tag versions.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = {}
+
+    def _get(self, tag, load):
+        [version] = get_tag_versions([tag])
+        loaded = self._loaded.get(tag)
+        if loaded is None or loaded[0] != version:
+            with self._lock:
+                loaded = self._loaded.get(tag)
+                if loaded is None or loaded[0] != version:
+                    loaded = self._loaded[tag] = (version, load(version))
+        return loaded
+
+    def get(self):
+        return self._get('categories', self._load)
+
+    def get_totals(self):
+        return self._get('category-totals', self._load_totals)
+
+    def etag(self):
+        # The response carries the totals too, so a cached copy is stale once either version moves
+        return f'"categories-{self.get()[0]}-{self.get_totals()[0]}"'
+
+    def tree(self):
+        totals = self.get_totals()[1]
+
+        def with_totals(nodes):
+            return [{
+                'id': node['id'],
+                'title': node['title'],
+                'parent': node['parent'],
+                'book_total': totals.get(node['id'], (0, 0))[0],
+                'available_total': totals.get(node['id'], (0, 0))[1],
+                'children': with_totals(node['children']) if node['children'] else None,
+            } for node in nodes]
+
+        return with_totals(self.get()[1]['tree'])
+
+    def choices(self):
+        return [(str(category_id), title) for category_id, title, path in self.get()[1]['choices']]
+
+    def paths(self, category_ids):
+        category_ids = {int(category_id) for category_id in category_ids}
+        return [path for category_id, title, path in self.get()[1]['choices'] if category_id in category_ids]
+
+    @staticmethod
+    def _load(version):
+        key = f'category-tree:{version}'
+        blob = cache.get(key)
+        if blob is None:
+            categories = list(Category.objects.order_by('id').defer('book_total', 'available_total'))
+            blob = {
+                'tree': _tree_nodes(build_category_tree(categories)),
+                'choices': [(category.id, category.title, category.path) for category in categories],
+            }
+            # Blobs of older versions are never read again and simply expire
+            cache.set(key, blob, CATEGORY_TREE_TIMEOUT)
+        return blob
+
+    @staticmethod
+    def _load_totals(version):
+        key = f'category-totals:{version}'
+        totals = cache.get(key)
+        if totals is None:
+            totals = {
+                category_id: (books, copies) for category_id, books, copies in
+                Category.objects.values_list('id', 'book_total', 'available_total')
+            }
+            cache.set(key, totals, CATEGORY_TREE_TIMEOUT)
+        return totals
+
+
+def _tree_nodes(categories):
+    return [{
+        'id': category.id,
+        'title': category.title,
+        'parent': category.parent_id,
+        'children': _tree_nodes(category.tree_children) or None,
+    } for category in categories]
+
+
+category_tree = CategoryTreeCache()
+
+
+def category_choices():
+    # Filters are deep-copied per FilterSet, so they get this function instead of the bound method
+    return category_tree.choices()
@@ -0,0 +1,93 @@
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, Coalesce, Greatest
+
+from library.models import Book, BaseRequestModel, Category
+from library.signals import invalidate_on_commit
+
+COUNTER_CHUNK_SIZE = 1000
+COUNTER_FIELDS = [
+    'borrow_count', 'review_count', 'scored_review_count', 'score_total', 'average_score', 'active_loan_count'
+]
+
+
+def borrow_copy(book_id, category_id):
+    """
+    Takes one copy of the book out of the inventory with a single conditional UPDATE, so concurrent
+    approvals can never oversell. Returns False when no copy is left.
+    """
+    taken = Book.objects.filter(id=book_id, count__gt=0).update(
+        count=F('count') - 1,
+        borrow_count=F('borrow_count') + 1,
+        active_loan_count=F('active_loan_count') + 1,
+    )
+    if taken:
+        book_inventory_changed(book_id, category_id, -1)
+    return bool(taken)
+
+
+def return_copy(book_id, category_id):
+    """
+    Puts one copy of the book back with a single UPDATE.
+    """
+    Book.objects.filter(id=book_id).update(
+        count=F('count') + 1,
+        active_loan_count=Greatest(F('active_loan_count') - 1, 0),
+    )
+    book_inventory_changed(book_id, category_id, 1)
+
+
+def book_inventory_changed(book_id, category_id, delta):
+    # Queryset updates skip Book.save and its signals, so rollups and caches are moved here
+    Category.shift_book_totals(category_id, 0, delta)
+    invalidate_on_commit('home', 'books', f'book:{book_id}')
+
+
+def record_review(book_id, score_total, reviews=1, scored_reviews=1):
+    """
+    Adds accepted reviews to the book. Reviews without a score count as reviews but stay out of
+    the average, the same way rebuild_book_counters counts them.
+    """
+    updates = {'review_count': F('review_count') + reviews}
+    if scored_reviews:
+        updates.update(
+            scored_review_count=F('scored_review_count') + scored_reviews,
+            score_total=F('score_total') + score_total,
+            average_score=Cast(F('score_total') + score_total, FloatField()) / (
+                F('scored_review_count') + scored_reviews),
+        )
+    Book.objects.filter(id=book_id).update(**updates)
+
+
+def rebuild_book_counters(chunk_size=COUNTER_CHUNK_SIZE):
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(book_ids), chunk_size):
+        _rebuild_chunk(book_ids[start:start + chunk_size])
+    return len(book_ids)
+
+
+def _rebuild_chunk(book_ids):
+    accepted = Q(status='accepted')
+    stats = BaseRequestModel.objects.filter(book_id__in=book_ids).values('book').annotate(
+        borrows=Count('id', filter=accepted & Q(type='borrow')),
+        reviews=Count('id', filter=accepted & Q(type='review')),
+        scored_reviews=Count('reviewrequest__score', filter=accepted & Q(type='review')),
+        scores=Coalesce(Sum('reviewrequest__score', filter=accepted & Q(type='review')), 0),
+        active_loans=Count('id', filter=accepted & Q(type='borrow', borrowrequest__is_finished=False)),
+    )
+    stats_by_book = {row['book']: row for row in stats}
+
+    books = []
+    for book_id in book_ids:
+        row = stats_by_book.get(book_id, {})
+        scored_reviews = row.get('scored_reviews', 0)
+        scores = row.get('scores', 0)
+        books.append(Book(
+            id=book_id,
+            borrow_count=row.get('borrows', 0),
+            review_count=row.get('reviews', 0),
+            scored_review_count=scored_reviews,
+            score_total=scores,
+            average_score=scores / scored_reviews if scored_reviews else 0,
+            active_loan_count=row.get('active_loans', 0),
+        ))
+    Book.objects.bulk_update(books, COUNTER_FIELDS)
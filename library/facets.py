@@ -0,0 +1,89 @@
+import hashlib
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import BooleanField, Case, F, Value, When
+
+from library.caching import RESPONSE_CACHE_TIMEOUT, get_tag_versions
+
+YEAR_BUCKET_SIZE = 10
+PUBLISHER_FACET_LIMIT = 20
+IGNORED_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'facets'}
+
+
+def compute_book_facets(queryset):
+    """
+    Counts the filtered books per category, availability, publication decade and publisher in a
+    single query. The GROUPING SETS return one row per facet value instead of one per combination,
+    and GROUPING() tells which facet a row belongs to, since a facet value itself may be NULL.
+    """
+    facet_rows = queryset.order_by().annotate(
+        facet_category=F('category_id'),
+        facet_category_title=F('category__title'),
+        facet_available=Case(When(count__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        facet_year=F('publication_year') / YEAR_BUCKET_SIZE * YEAR_BUCKET_SIZE,
+        facet_publisher=F('publisher'),
+    ).values('facet_category', 'facet_category_title', 'facet_available', 'facet_year', 'facet_publisher')
+    sql, params = facet_rows.query.sql_with_params()
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT facet_category, facet_category_title, facet_available, facet_year, facet_publisher, COUNT(*), '
+            'GROUPING(facet_category), GROUPING(facet_available), GROUPING(facet_year) '
+            f'FROM ({sql}) AS facet_rows GROUP BY GROUPING SETS ('
+            '(facet_category, facet_category_title), (facet_available), (facet_year), (facet_publisher))',
+            params,
+        )
+        rows = cursor.fetchall()
+
+    categories = Counter()
+    category_titles = {}
+    availability = Counter()
+    years = Counter()
+    publishers = Counter()
+    for category_id, title, available, year_bucket, publisher, total, by_category, by_availability, by_year in rows:
+        if not by_category:
+            categories[category_id] = total
+            category_titles[category_id] = title
+        elif not by_availability:
+            availability['available' if available else 'unavailable'] = total
+        elif not by_year:
+            years[year_bucket] = total
+        else:
+            publishers[publisher] = total
+
+    return {
+        'category': [
+            {'id': category_id, 'title': category_titles[category_id], 'count': total}
+            for category_id, total in categories.most_common()
+        ],
+        'availability': {
+            'available': availability['available'],
+            'unavailable': availability['unavailable'],
+        },
+        'publication_year': [
+            {'from': bucket, 'to': bucket + YEAR_BUCKET_SIZE - 1, 'count': years[bucket]}
+            for bucket in sorted(years)
+        ],
+        'publisher': [
+            {'value': publisher, 'count': total}
+            for publisher, total in publishers.most_common(PUBLISHER_FACET_LIMIT)
+        ],
+    }
+
+
+def get_book_facets(request, queryset):
+    params = sorted(
+        (key, value) for key, values in request.query_params.lists() if key not in IGNORED_PARAMS
+        for value in values
+    )
+    # Category titles and subtrees come from the tree, so a rename or move outdates the facets too
+    books_version, categories_version = get_tag_versions(['books', 'categories'])
+    key = f'facets:{hashlib.md5(repr(params).encode()).hexdigest()}:{books_version}:{categories_version}'
+
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_book_facets(queryset)
+        cache.set(key, facets, RESPONSE_CACHE_TIMEOUT)
+    return facets
@@ -1,28 +1,84 @@
-from django.db.models import Q, Count
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django_filters import rest_framework as filters
 
-from library.models import Book, ReviewRequest, Notification, BorrowRequest, Category
+from core.normalizers import normalize_persian
+from library.category_cache import category_choices, category_tree
+from library.models import Book, ReviewRequest, Notification, BorrowRequest
+
+
+def build_prefix_search_query(value):
+    terms = re.findall(r'\w+', normalize_persian(value))
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
 
 
 class CustomBookFilterSet(filters.FilterSet):
+    search = filters.CharFilter(method='full_text_search', label='جستجو')
+    fuzzy = filters.BooleanFilter(method='fuzzy_filter', label='جستجوی تقریبی')
     is_available = filters.BooleanFilter(method='is_available_filter', label='فقط موجود ها')
     filter_type = filters.ChoiceFilter(
         method='filter_by_type',
         choices=[('latest', 'تازه ترین ها'), ('popular', 'پرطرفدار ها'), ('most_popular', 'محبوب ترین ها')],
         label='مرتب سازی'
     )
-    category = filters.ModelMultipleChoiceFilter(
-        queryset=Category.objects.all(),
+    category = filters.MultipleChoiceFilter(
+        choices=category_choices,
         field_name='category',
-        conjoined=False,
+        method='category_filter',
         label="دسته بندی"
     )
+    include_descendants = filters.BooleanFilter(method='include_descendants_filter', label='شامل زیردسته‌ها')
 
     class Meta:
         model = Book
         fields = ['category', 'filter_type']
 
+    def full_text_search(self, queryset, name, value):
+        if self.form.cleaned_data.get('fuzzy'):
+            return self.trigram_search(queryset, normalize_persian(value))
+
+        query = build_prefix_search_query(value)
+        if query is None:
+            return queryset
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', 'id')
+
+    def trigram_search(self, queryset, value):
+        if not value:
+            return queryset
+        return queryset.filter(
+            Q(title_key__trigram_word_similar=value) | Q(author_key__trigram_word_similar=value)
+        ).annotate(
+            similarity=Greatest(TrigramWordSimilarity(value, 'title_key'), TrigramWordSimilarity(value, 'author_key')),
+        ).order_by('-similarity', 'id')
+
+    def fuzzy_filter(self, queryset, name, value):
+        # Only switches the matching mode of the search filter
+        return queryset
+
+    def category_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        if not self.form.cleaned_data.get('include_descendants'):
+            return queryset.filter(category__in=value)
+
+        # A subtree is every category whose materialized path starts with the root's path
+        in_subtrees = Q()
+        for path in category_tree.paths(value):
+            in_subtrees |= Q(category__path__startswith=path)
+        return queryset.filter(in_subtrees)
+
+    def include_descendants_filter(self, queryset, name, value):
+        # Only switches the matching mode of the category filter
+        return queryset
+
     def is_available_filter(self, queryset, name, value):
         if value == True:
             return queryset.filter(count__gt=0)
@@ -33,13 +89,9 @@ class CustomBookFilterSet(filters.FilterSet):
         if value == 'latest':
             return queryset.order_by('-created_at')
         elif value == 'popular':
-            return queryset.annotate(
-                borrow_requests_count=Count('requests', filter=Q(requests__borrowrequest__isnull=False)),
-            ).order_by('-borrow_requests_count')
+            return queryset.order_by('-borrow_count')
         elif value == 'most_popular':
-            return queryset.annotate(
-                review_requests_count=Count('requests', filter=Q(requests__reviewrequest__isnull=False)),
-            ).order_by('-review_requests_count')
+            return queryset.order_by('-review_count')
         return queryset
 
 
@@ -0,0 +1,78 @@
+from collections import Counter
+
+from django.db.models import Count, Sum
+
+from library.models import Book, Category
+
+
+def build_category_tree(categories):
+    """
+    Links categories loaded in one query into a tree and returns the roots.
+    Each category gets its direct children in `tree_children`.
+    """
+    categories = list(categories)
+    by_id = {category.id: category for category in categories}
+    roots = []
+    for category in categories:
+        category.tree_children = []
+    for category in categories:
+        parent = by_id.get(category.parent_id)
+        if parent is None:
+            roots.append(category)
+        else:
+            parent.tree_children.append(category)
+    return roots
+
+
+def load_category_ancestors(categories):
+    """
+    Attaches the ancestor chain (root first, the category itself last) to each category
+    in `ancestors`, with one query for all of them.
+    """
+    categories = [category for category in categories if category is not None]
+    ancestor_ids = {ancestor_id for category in categories for ancestor_id in category.ancestor_ids}
+    by_id = Category.objects.in_bulk(ancestor_ids)
+    for category in categories:
+        category.ancestors = [by_id[ancestor_id] for ancestor_id in category.ancestor_ids if ancestor_id in by_id]
+    return categories
+
+
+def rebuild_category_paths():
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_of(category_id, seen=()):
+        if category_id not in paths:
+            parent_id = parents[category_id]
+            # A cycle left over from before paths were maintained is cut at the repeated node
+            if parent_id is None or parent_id in seen or parent_id not in parents:
+                paths[category_id] = f'{category_id}/'
+            else:
+                paths[category_id] = f'{path_of(parent_id, seen + (category_id,))}{category_id}/'
+        return paths[category_id]
+
+    categories = [Category(id=category_id, path=path_of(category_id)) for category_id in parents]
+    Category.objects.bulk_update(categories, ['path'], batch_size=1000)
+    return len(categories)
+
+
+def rebuild_category_totals():
+    """
+    Recomputes the subtree book and available copy totals of every category from the books.
+    """
+    direct = Book.objects.filter(category__isnull=False).values('category').annotate(
+        books=Count('id'), copies=Sum('count'),
+    )
+    paths = dict(Category.objects.values_list('id', 'path'))
+    books, copies = Counter(), Counter()
+    for row in direct:
+        for ancestor_id in Category(path=paths[row['category']]).ancestor_ids:
+            books[ancestor_id] += row['books']
+            copies[ancestor_id] += row['copies']
+
+    categories = [
+        Category(id=category_id, book_total=books[category_id], available_total=copies[category_id])
+        for category_id in paths
+    ]
+    Category.objects.bulk_update(categories, ['book_total', 'available_total'], batch_size=1000)
+    return len(categories)
@@ -0,0 +1,149 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from codinto_library.utils import SMS_RECIPIENTS_PER_REQUEST
+from library.loans import loan_pairs
+from library.models import BaseRequestModel, Book, BookHold, Notification
+
+BOOK_RESERVED = '! نسخه های موجود این کتاب برای کاربران صف انتظار رزرو شده است'
+
+
+def adopt_subscriptions(book_id=None):
+    """
+    Turns the "notify me when available" notifications stored before the hold queue existed into
+    waiting holds, oldest subscription first, and deletes them. Users already queued for the book
+    keep their hold. Runs for a single book before its queue is read or offered, so nobody is
+    skipped until the adopt_availability_subscriptions command has converted everything.
+    """
+    subscriptions = Notification.objects.filter(type='available', user__isnull=False, book__isnull=False)
+    if book_id is not None:
+        subscriptions = subscriptions.filter(book_id=book_id)
+    with transaction.atomic():
+        rows = list(subscriptions.select_for_update().order_by('created_at', 'id').values_list(
+            'id', 'user_id', 'book_id'))
+        if not rows:
+            return 0
+        pairs = list(dict.fromkeys((user_id, book_id) for subscription_id, user_id, book_id in rows))
+        # Holds get their ids in insertion order, which is the queue order
+        BookHold.objects.bulk_create([BookHold(user_id=user_id, book_id=book_id) for user_id, book_id in pairs],
+                                     batch_size=1000, ignore_conflicts=True)
+        Notification.objects.filter(id__in=[subscription_id for subscription_id, *pair in rows]).delete()
+    return len(pairs)
+
+
+def reserved_copies(book_id, exclude_user_id=None):
+    offers = BookHold.objects.filter(book_id=book_id, status='offered')
+    if exclude_user_id is not None:
+        offers = offers.exclude(user_id=exclude_user_id)
+    return offers.count()
+
+
+def free_copies(book):
+    """
+    Copies on the shelf that no active hold is entitled to: offered holds keep theirs, and waiting
+    holds are first in line for the rest.
+    """
+    return book.count - BookHold.objects.filter(book_id=book.id, status__in=BookHold.ACTIVE_STATUSES).count()
+
+
+def check_reservation(book, user_id):
+    """
+    Copies offered to the hold queue are kept for their holders; anyone else may only take
+    the copies left over.
+    """
+    reserved = reserved_copies(book.id, exclude_user_id=user_id)
+    if reserved and book.count - reserved <= 0:
+        return BOOK_RESERVED
+    return None
+
+
+def fulfil_holds(requests):
+    if requests:
+        BookHold.objects.filter(loan_pairs(requests), status__in=BookHold.ACTIVE_STATUSES).update(
+            status='fulfilled', updated_at=timezone.now())
+
+
+def schedule_offer(book_id):
+    schedule_offers([book_id])
+
+
+def schedule_offers(book_ids):
+    """
+    Queues offer_copies for every book after the current transaction commits, so whatever freed
+    the copies never waits on the queue and its texts.
+    """
+    from library.tasks import offer_copies_task
+
+    def offer():
+        for book_id in book_ids:
+            offer_copies_task.delay(book_id)
+
+    book_ids = list(book_ids)
+    if book_ids:
+        transaction.on_commit(offer)
+
+
+@transaction.atomic
+def offer_copies(book_id):
+    """
+    Offers the copies of a book that are neither borrowed nor already offered to the next waiting
+    holds, oldest first, with a single UPDATE. The book row is locked so concurrent returns cannot
+    offer the same copy twice.
+    """
+    book = Book.objects.select_for_update().filter(pk=book_id).values_list('count', 'title').first()
+    if not book or not book[0]:
+        return 0
+    adopt_subscriptions(book_id)
+    count, title = book
+    free = count - reserved_copies(book_id)
+    if free <= 0:
+        return 0
+
+    queue = BookHold.objects.filter(book_id=book_id, status='waiting').order_by('id').values('id')[:free]
+    now = timezone.now()
+    offered = BookHold.objects.filter(id__in=queue, status='waiting').update(
+        status='offered', offered_at=now, offer_expires_at=now + timezone.timedelta(hours=settings.HOLD_OFFER_HOURS),
+        updated_at=now)
+    if offered:
+        transaction.on_commit(lambda: send_offer_sms(book_id, title, now))
+    return offered
+
+
+def send_offer_sms(book_id, title, offered_at):
+    """
+    Texts the users who were just offered a copy, a chunk of recipients per provider call.
+    The numbers are streamed, so a large restock does not load every holder at once.
+    """
+    from library.tasks import send_bulk_sms_task
+
+    message = (f"کتاب {title} برای شما رزرو شد. "
+               f"تا {settings.HOLD_OFFER_HOURS} ساعت فرصت دارید درخواست امانت ثبت کنید")
+    numbers = BookHold.objects.filter(
+        book_id=book_id, status='offered', offered_at=offered_at,
+    ).exclude(user__phone_number='').values_list('user__phone_number', flat=True).iterator(
+        chunk_size=SMS_RECIPIENTS_PER_REQUEST)
+    while chunk := list(islice(numbers, SMS_RECIPIENTS_PER_REQUEST)):
+        send_bulk_sms_task.delay(chunk, message)
+
+
+def expire_offers():
+    """
+    Expires the offers whose claim window has passed and hands their copies to the next holds.
+    An offer already claimed with a pending borrow request is kept until that request is decided.
+    """
+    claimed = BaseRequestModel.objects.filter(
+        user_id=OuterRef('user_id'), book_id=OuterRef('book_id'), type='borrow', status='pending')
+    with transaction.atomic():
+        expired = list(BookHold.objects.select_for_update(skip_locked=True).filter(
+            status='offered', offer_expires_at__lt=timezone.now(),
+        ).exclude(Exists(claimed)).values_list('id', 'book_id'))
+        BookHold.objects.filter(id__in=[hold_id for hold_id, book_id in expired]).update(
+            status='expired', updated_at=timezone.now())
+
+    for book_id in {book_id for hold_id, book_id in expired}:
+        offer_copies(book_id)
+    return len(expired)
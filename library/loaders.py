@@ -0,0 +1,28 @@
+from library.models import BaseRequestModel, BorrowRequest, ExtensionRequest, ReviewRequest, ReturnRequest
+
+REQUEST_SUBTYPES = {
+    'borrow': BorrowRequest,
+    'extension': ExtensionRequest,
+    'review': ReviewRequest,
+    'return': ReturnRequest,
+}
+
+
+def load_request_subtypes(requests):
+    """
+    Attaches the subtype row (obj.borrowrequest, obj.reviewrequest, ...) to each BaseRequestModel
+    with one query per request type present, instead of one query per request.
+    """
+    ids_by_type = {}
+    for request in requests:
+        if request.type in REQUEST_SUBTYPES:
+            ids_by_type.setdefault(request.type, []).append(request.pk)
+
+    for request_type, ids in ids_by_type.items():
+        model = REQUEST_SUBTYPES[request_type]
+        related = getattr(BaseRequestModel, model._meta.model_name).related
+        subtypes = model.objects.in_bulk(ids)
+        for request in requests:
+            if request.type == request_type:
+                related.set_cached_value(request, subtypes.get(request.pk))
+    return requests
@@ -0,0 +1,101 @@
+from django.contrib.postgres.aggregates import BoolOr
+from django.db.models import Count, F, FilteredRelation, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from library.models import ActiveLoan, Book, BookHold, BorrowRequest
+
+
+def open_loans(borrow_requests):
+    """
+    Records accepted borrows as active loans. A loan still open for the same user and book is
+    replaced, since the unique (user, book) index allows one loan per pair.
+    """
+    ActiveLoan.objects.bulk_create(
+        [
+            ActiveLoan(user_id=borrow.user_id, book_id=borrow.book_id, borrow_request=borrow,
+                       start=borrow.start_date, due=borrow.end_date)
+            for borrow in borrow_requests
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'book'],
+        update_fields=['borrow_request', 'start', 'due', 'extended'],
+    )
+
+
+def extend_loans(extension_requests):
+    by_days = {}
+    for extension in extension_requests:
+        by_days.setdefault(extension.time, []).append(extension)
+    for days, extensions in by_days.items():
+        ActiveLoan.objects.filter(loan_pairs(extensions)).update(
+            due=F('due') + timezone.timedelta(days=days),
+            extended=True,
+        )
+
+
+def close_loans(return_requests):
+    if return_requests:
+        ActiveLoan.objects.filter(loan_pairs(return_requests)).delete()
+
+
+def loan_pairs(requests):
+    pairs = Q()
+    for request in requests:
+        pairs |= Q(user_id=request.user_id, book_id=request.book_id)
+    return pairs
+
+
+def rebuild_active_loans():
+    """
+    Recreates the active loan table from the accepted, unfinished borrow requests. When a pair has
+    several, the latest borrow wins.
+    """
+    borrows = {}
+    for borrow in BorrowRequest.objects.filter(status='accepted', is_finished=False).order_by('id'):
+        borrows[borrow.user_id, borrow.book_id] = borrow
+
+    loans = []
+    for borrow in borrows.values():
+        start = borrow.start_date or borrow.created_at
+        due = borrow.end_date or start + timezone.timedelta(days=borrow.time)
+        loans.append(ActiveLoan(user_id=borrow.user_id, book_id=borrow.book_id, borrow_request=borrow,
+                                start=start, due=due))
+    ActiveLoan.objects.all().delete()
+    ActiveLoan.objects.bulk_create(loans, batch_size=1000)
+    return len(loans)
+
+
+def resolve_loan_state(user, book_id):
+    """
+    Loads the book together with everything request creation needs to know about the user's
+    relation to it (pending requests per type, reviews, returns and the active loan) in one
+    query with conditional aggregates. Raises Http404 for an unknown book.
+    """
+    return get_object_or_404(loan_state_queryset(user), pk=book_id)
+
+
+def loan_state_queryset(user):
+    def requests(**lookups):
+        return Count('my_requests', filter=Q(**{f'my_requests__{field}': value for field, value in lookups.items()}))
+
+    return Book.objects.annotate(
+        my_requests=FilteredRelation('requests', condition=Q(requests__user=user)),
+        my_loan=FilteredRelation('active_loans', condition=Q(active_loans__user=user)),
+    ).annotate(
+        pending_requests=requests(status='pending'),
+        pending_borrows=requests(status='pending', type='borrow'),
+        pending_extensions=requests(status='pending', type='extension'),
+        pending_returns=requests(status='pending', type='return'),
+        accepted_returns=requests(status='accepted', type='return'),
+        reviews=requests(type='review'),
+        # At most one loan per (user, book), so joining it does not multiply the counts
+        loan_id=Max('my_loan__id'),
+        loan_extended=BoolOr('my_loan__extended', default=False),
+        # Copies kept for other users' hold offers
+        reserved_for_others=Coalesce(Subquery(
+            BookHold.objects.filter(book=OuterRef('pk'), status='offered').exclude(user=user).order_by().values(
+                'book').annotate(total=Count('id')).values('total')
+        ), 0),
+    )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.holds import adopt_subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Moves the "notify me when available" notifications into the hold queue, oldest first'
+
+    def handle(self, *args, **options):
+        total = adopt_subscriptions()
+        self.stdout.write(self.style.SUCCESS(f'Queued {total} holds from availability subscriptions'))
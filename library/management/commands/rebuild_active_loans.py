@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.loans import rebuild_active_loans
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the active loan table from the accepted, unfinished borrow requests'
+
+    def handle(self, *args, **options):
+        total = rebuild_active_loans()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} active loans'))
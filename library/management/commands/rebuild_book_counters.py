@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from library.counters import COUNTER_CHUNK_SIZE, rebuild_book_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized borrow, review, score and active loan counters on every book'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=COUNTER_CHUNK_SIZE,
+                            help='Number of books recomputed per query')
+
+    def handle(self, *args, **options):
+        total = rebuild_book_counters(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {total} books'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from library.hierarchy import rebuild_category_paths, rebuild_category_totals
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the ancestry path and the subtree book totals of every category'
+
+    def handle(self, *args, **options):
+        total = rebuild_category_paths()
+        # Totals roll up along the paths, so they are rebuilt after them
+        rebuild_category_totals()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt paths and totals for {total} categories'))
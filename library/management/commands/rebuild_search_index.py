@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Profile
+from core.normalizers import normalize_persian
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the normalized search keys of every book and profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of rows updated per statement')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        def rebuild(queryset, builders):
+            rows = []
+            total = 0
+            for row in queryset.order_by('id').iterator(chunk_size=chunk_size):
+                for field, build in builders.items():
+                    setattr(row, field, build(row))
+                rows.append(row)
+                if len(rows) >= chunk_size:
+                    total += queryset.model.objects.bulk_update(rows, list(builders))
+                    rows = []
+            return total + queryset.model.objects.bulk_update(rows, list(builders))
+
+        books = rebuild(Book.objects.defer('search_vector'), {
+            'search_vector': Book.build_search_vector,
+            'title_key': lambda book: normalize_persian(book.title),
+            'author_key': lambda book: normalize_persian(book.author),
+        })
+        profiles = rebuild(Profile.objects.all(), {'search_key': Profile.build_search_key})
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search keys for {books} books and {profiles} profiles'))
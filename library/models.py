@@ -1,8 +1,15 @@
-from django.db import models
-from django.utils import timezone
+from collections import Counter
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Concat, Substr
 
 from core.models import BaseModel
+from core.normalizers import normalize_persian
 from core.models import Profile
+from library.caching import invalidate_tags
 
 
 # Create your models here.
@@ -10,6 +17,13 @@ class Category(models.Model):
     title = models.CharField(max_length=255, unique=True, verbose_name="عنوان دسته‌بندی")
     parent = models.ForeignKey('self', blank=True, null=True, on_delete=models.SET_NULL, related_name='children',
                                verbose_name="دسته‌بندی پدر")
+    # Materialized ancestry, e.g. '1/4/9/' for category 9 under 4 under 1
+    path = models.CharField(max_length=255, default='', editable=False, db_index=True, verbose_name="مسیر")
+    # Rollups over the whole subtree, kept current by Book and Category writes
+    book_total = models.PositiveIntegerField(default=0, editable=False, verbose_name="تعداد کتاب‌ها")
+    available_total = models.PositiveBigIntegerField(default=0, editable=False, verbose_name="تعداد نسخه‌های موجود")
+
+    MAINTAINED_FIELDS = {'path', 'book_total', 'available_total'}
 
     class Meta:
         verbose_name = "دسته‌بندی"
@@ -18,6 +32,98 @@ class Category(models.Model):
     def __str__(self):
         return self.title
 
+    @property
+    def ancestor_ids(self):
+        return [int(category_id) for category_id in self.path.split('/') if category_id]
+
+    def get_ancestors(self, include_self=True):
+        ancestor_ids = self.ancestor_ids if include_self else self.ancestor_ids[:-1]
+        # Every ancestor path is a prefix of the next one, so sorting by path sorts root first
+        return Category.objects.filter(id__in=ancestor_ids).order_by('path')
+
+    def get_descendants(self):
+        return Category.objects.filter(path__startswith=self.path).exclude(pk=self.pk)
+
+    def save(self, *args, **kwargs):
+        if self.pk and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Path and totals are maintained in the database; a stale instance must not write them back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
+        # A half-applied move would leave the subtree with wrong paths and totals
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Locking the row and its new parent keeps a concurrent move from changing either path under us
+            rows = {
+                pk: (path, totals) for pk, path, *totals in Category.objects.select_for_update().filter(
+                    pk__in=[self.pk, self.parent_id]).order_by('pk').values_list(
+                    'pk', 'path', 'book_total', 'available_total')
+            }
+            old_path, totals = rows[self.pk]
+            new_path = f'{rows[self.parent_id][0] if self.parent_id else ""}{self.pk}/'
+            if new_path != old_path:
+                Category.objects.filter(pk=self.pk).update(path=new_path)
+                if old_path:
+                    Category.move_subtree(old_path, new_path)
+                    # The subtree's books leave the old ancestors and join the new ones
+                    Category.shift_totals(old_path, -totals[0], -totals[1], include_self=False)
+                    Category.shift_totals(new_path, totals[0], totals[1], include_self=False)
+        self.path = new_path
+
+    @staticmethod
+    def move_subtree(old_path, new_path):
+        Category.objects.filter(path__startswith=old_path).exclude(path=new_path).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1))
+        )
+
+    @staticmethod
+    def shift_totals(path, books, copies, include_self=True):
+        ancestor_ids = [int(category_id) for category_id in path.split('/') if category_id]
+        if not include_self:
+            ancestor_ids = ancestor_ids[:-1]
+        if not ancestor_ids or not (books or copies):
+            return
+        Category.objects.filter(id__in=ancestor_ids).update(
+            book_total=F('book_total') + books,
+            available_total=F('available_total') + copies,
+        )
+        transaction.on_commit(lambda: invalidate_tags('category-totals'))
+
+    @staticmethod
+    def shift_book_totals(category_id, books, copies):
+        if category_id is None or not (books or copies):
+            return
+        path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if path:
+            Category.shift_totals(path, books, copies)
+
+    @staticmethod
+    def shift_available_totals(copies_by_category):
+        """
+        Moves the available copies of many categories at once: the deltas are summed per ancestor
+        and written with one UPDATE, so the cost does not grow with the number of categories.
+        """
+        copies_by_category = {
+            category_id: copies for category_id, copies in copies_by_category.items()
+            if category_id is not None and copies
+        }
+        if not copies_by_category:
+            return
+        deltas = Counter()
+        for category_id, path in Category.objects.filter(pk__in=copies_by_category).values_list('pk', 'path'):
+            for ancestor_id in path.split('/'):
+                if ancestor_id:
+                    deltas[int(ancestor_id)] += copies_by_category[category_id]
+        deltas = {category_id: delta for category_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        Category.objects.filter(id__in=deltas).update(available_total=F('available_total') + Case(
+            *[When(id=category_id, then=Value(delta)) for category_id, delta in deltas.items()],
+            default=Value(0),
+        ))
+        transaction.on_commit(lambda: invalidate_tags('category-totals'))
+
 
 class Book(BaseModel, models.Model):
     title = models.CharField(max_length=255, verbose_name="عنوان کتاب")
@@ -34,23 +140,122 @@ class Book(BaseModel, models.Model):
     count = models.PositiveIntegerField(verbose_name="تعداد موجودی")
     category = models.ForeignKey('Category', on_delete=models.SET_NULL, null=True, related_name="books",
                                  verbose_name="دسته‌بندی")
+    borrow_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="تعداد امانت")
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="تعداد نظرات")
+    scored_review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="تعداد امتیازها")
+    score_total = models.PositiveIntegerField(default=0, editable=False, verbose_name="مجموع امتیازها")
+    average_score = models.FloatField(default=0, editable=False, verbose_name="میانگین امتیاز")
+    active_loan_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="امانت‌های فعال")
+    search_vector = SearchVectorField(null=True, editable=False)
+    title_key = models.CharField(max_length=255, blank=True, default='', editable=False)
+    author_key = models.CharField(max_length=255, blank=True, default='', editable=False)
+
+    MAINTAINED_FIELDS = {
+        'borrow_count', 'review_count', 'scored_review_count', 'score_total', 'average_score', 'active_loan_count'
+    }
+    SEARCH_FIELDS = ('title', 'author', 'translator', 'publisher', 'description')
 
     class Meta:
         verbose_name = "کتاب"
         verbose_name_plural = "کتاب‌ها"
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='book_created_at_id_idx'),
+            models.Index(fields=['-borrow_count'], name='book_borrow_count_idx'),
+            models.Index(fields=['-review_count'], name='book_review_count_idx'),
+            GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+            GinIndex(OpClass('title_key', name='gin_trgm_ops'), name='book_title_trgm_idx'),
+            GinIndex(OpClass('author_key', name='gin_trgm_ops'), name='book_author_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        if self.pk:
-            from library.utils import handle_availability
-            old_count = Book.objects.get(pk=self.pk).count
-
-            if old_count == 0 and self.count > 0:
-                handle_availability(self.id)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot of what the category rollups currently account for this book. Without both
+        # fields (.only()/.defer()) there is nothing to diff against and the rollups are left alone
+        if not {'category_id', 'count'} - set(field_names):
+            instance._rollup_state = (instance.category_id, instance.count)
+        # Text the stored search_vector was built from, so saves that leave it alone skip rebuilding it
+        if not set(cls.SEARCH_FIELDS) - set(field_names):
+            instance._search_state = instance.search_state()
+        return instance
 
-        super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        rollup_state = getattr(self, '_rollup_state', None) if self.pk else (None, 0)
+        # Compared against the count loaded with the instance; without a snapshot the offer task
+        # finds out on its own whether there is anything to offer
+        restocked = self.pk is not None and self.count > 0 and (rollup_state is None or self.count > rollup_state[1])
+
+        update_fields = kwargs.get('update_fields')
+        if self.pk and update_fields is None and not kwargs.get('force_insert'):
+            # Counters are maintained with F() updates in the database; a stale instance must not write them back
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS and field.attname not in deferred
+                and field.name != 'search_vector'
+            ]
+        # Only rebuilt when text it is made of is written and differs from what it was last built from
+        search_state = None
+        if update_fields is None or set(self.SEARCH_FIELDS) & set(update_fields):
+            search_state = self.search_state()
+        loaded_state = getattr(self, '_search_state', None)
+        reindex = search_state is not None and search_state != loaded_state
+        # Read by the cache signals: only title and author changes move the suggestion index
+        self._titles_changed = reindex and (loaded_state is None or search_state[:2] != loaded_state[:2])
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'title', 'author'} & update_fields:
+                update_fields |= {'title_key', 'author_key'}
+            if reindex:
+                update_fields.add('search_vector')
+            kwargs['update_fields'] = update_fields
+
+        self.title_key = normalize_persian(self.title)
+        self.author_key = normalize_persian(self.author)
+        if reindex:
+            # Written by the INSERT/UPDATE of this save itself, with no second statement
+            self.search_vector = self.build_search_vector()
+        # The row and its category rollups are written together; like Model.save_base, no savepoint is
+        # needed since a failure rolls back whatever transaction the save runs in
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            self.update_category_totals(rollup_state)
+        if reindex:
+            self._search_state = search_state
+            # The instance holds the expression, not the stored tsvector; reading it again loads the column
+            del self.search_vector
+        if restocked:
+            from library.holds import schedule_offer
+            schedule_offer(self.pk)
+
+    def update_category_totals(self, rollup_state):
+        if rollup_state is None:
+            return
+        old_category_id, old_count = rollup_state
+        if old_category_id == self.category_id:
+            Category.shift_book_totals(self.category_id, 0, self.count - old_count)
+        else:
+            Category.shift_book_totals(old_category_id, -1, -old_count)
+            Category.shift_book_totals(self.category_id, 1, self.count)
+        self._rollup_state = (self.category_id, self.count)
+
+    def search_state(self):
+        return tuple(getattr(self, field) for field in self.SEARCH_FIELDS)
+
+    def build_search_vector(self):
+        # 'simple' config: postgres ships no Persian stemmer, so normalized terms are indexed as they are
+        def vector(*values, weight):
+            text = normalize_persian(' '.join(value for value in values if value))
+            return SearchVector(Value(text), weight=weight, config='simple')
+
+        return (
+            vector(self.title, self.author, weight='A')
+            + vector(self.translator, self.publisher, weight='B')
+            + vector(self.description, weight='D')
+        )
 
 
 # class Review(BaseModel, models.Model):
@@ -94,6 +299,10 @@ class Notification(BaseModel, models.Model):
     class Meta:
         verbose_name = "اطلاع‌رسانی"
         verbose_name_plural = "اطلاع‌رسانی‌ها"
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='notif_created_at_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_at_idx'),
+        ]
 
     def __str__(self):
         user = self.user
@@ -102,6 +311,11 @@ class Notification(BaseModel, models.Model):
         return f"({user}) CREATED ({type}) NOTIFICATIONS ON ({book})"
 
 
+PENDING_REQUEST_CONSTRAINT = 'unique_pending_request'
+ACTIVE_LOAN_CONSTRAINT = 'unique_active_loan'
+ACTIVE_HOLD_CONSTRAINT = 'unique_active_hold'
+
+
 class BaseRequestModel(BaseModel):
     user = models.ForeignKey(Profile, on_delete=models.CASCADE, verbose_name="کاربر")
     book = models.ForeignKey('Book', on_delete=models.CASCADE, verbose_name="کتاب", related_name='requests')
@@ -122,6 +336,24 @@ class BaseRequestModel(BaseModel):
     ]
     type = models.CharField(max_length=12, choices=REQUEST_TYPE_CHOICES, default='borrow', verbose_name="نوع درخواست")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='request_created_at_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='request_user_created_at_idx'),
+            # Loan state of a (user, book) pair
+            models.Index(fields=['user', 'book', 'status'], name='request_user_book_status_idx'),
+            # Accepted reviews of a book, newest first
+            models.Index(fields=['book', 'status', '-created_at'], name='request_book_status_idx'),
+        ]
+        constraints = [
+            # Reviews are left out: a return is filed together with its pending review
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(status='pending') & ~models.Q(type='review'),
+                name=PENDING_REQUEST_CONSTRAINT,
+            ),
+        ]
+
     def __str__(self):
         return self.user.username
 
@@ -139,18 +371,10 @@ class BorrowRequest(BaseRequestModel):
     class Meta:
         verbose_name = "درخواست امانت"
         verbose_name_plural = "درخواست‌های امانت"
-
-    def calculate_duration(self, request):
-        t = self.time
-        self.duration = t
-        now = timezone.now()
-        self.start_date = now
-        self.end_date = now + timezone.timedelta(days=t)
-        self.save(update_fields=['start_date', 'duration', 'end_date'])
-
-    def reset_duration(self):
-        self.duration = 0
-        self.save()
+        indexes = [
+            # Borrow history filtered by return date
+            models.Index(fields=['end_date'], name='borrow_end_date_idx'),
+        ]
 
 
 class ExtensionRequest(BaseRequestModel):
@@ -165,14 +389,6 @@ class ExtensionRequest(BaseRequestModel):
         verbose_name = "درخواست تمدید"
         verbose_name_plural = "درخواست‌های تمدید"
 
-    def extend_duration(self, request):
-        self.duration = self.time
-        self.save()
-
-    def reset_duration(self):
-        self.duration = 0
-        self.save()
-
 
 class ReviewRequest(BaseRequestModel):
     score = models.IntegerField(null=True, verbose_name="امتیاز")
@@ -192,6 +408,96 @@ class ReturnRequest(BaseRequestModel):
         verbose_name_plural = "درخواست‌های بازگشت"
 
 
+class ActiveLoan(models.Model):
+    user = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='active_loans', verbose_name="کاربر")
+    book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='active_loans', verbose_name="کتاب")
+    borrow_request = models.OneToOneField(BorrowRequest, on_delete=models.CASCADE, related_name='active_loan',
+                                          verbose_name="درخواست امانت")
+    start = models.DateTimeField(verbose_name="تاریخ شروع امانت")
+    due = models.DateTimeField(verbose_name="موعد تحویل")
+    extended = models.BooleanField(default=False, verbose_name="تمدید شده")
+
+    class Meta:
+        verbose_name = "امانت فعال"
+        verbose_name_plural = "امانت‌های فعال"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name=ACTIVE_LOAN_CONSTRAINT),
+        ]
+        indexes = [
+            # Due date reminders
+            models.Index(fields=['due'], name='active_loan_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.book}"
+
+
+class BookHold(BaseModel, models.Model):
+    """
+    A user's place in a book's waiting queue. Holds are served in id order: a copy that becomes
+    free is offered to the oldest waiting hold and stays reserved for that user until the offer
+    is claimed with a borrow request or expires.
+    """
+    user = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='holds', verbose_name="کاربر")
+    book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='holds', verbose_name="کتاب")
+
+    ACTIVE_STATUSES = ['waiting', 'offered']
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('fulfilled', 'Fulfilled'),
+        ('expired', 'Expired'),
+    ]
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='waiting', verbose_name="وضعیت")
+    offered_at = models.DateTimeField(null=True, blank=True, verbose_name="زمان پیشنهاد")
+    offer_expires_at = models.DateTimeField(null=True, blank=True, verbose_name="مهلت پیشنهاد")
+
+    class Meta:
+        verbose_name = "نوبت رزرو"
+        verbose_name_plural = "نوبت‌های رزرو"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], condition=models.Q(status__in=['waiting', 'offered']),
+                                    name=ACTIVE_HOLD_CONSTRAINT),
+        ]
+        indexes = [
+            # Queue order and position of the waiting holds of a book
+            models.Index(fields=['book', 'id'], condition=models.Q(status='waiting'), name='hold_waiting_queue_idx'),
+            # Copies reserved for offered holds, and the offers to expire
+            models.Index(fields=['book'], condition=models.Q(status='offered'), name='hold_offered_book_idx'),
+            models.Index(fields=['offer_expires_at'], condition=models.Q(status='offered'),
+                         name='hold_offer_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.book} ({self.status})"
+
+    @property
+    def position(self):
+        if self.status != 'waiting':
+            return 0
+        return BookHold.objects.filter(book_id=self.book_id, status='waiting', id__lte=self.id).count()
+
+
+class OutboxEvent(BaseModel, models.Model):
+    TOPIC_CHOICES = [
+        ('request_decided', 'Request decided'),
+    ]
+    topic = models.CharField(max_length=32, choices=TOPIC_CHOICES, verbose_name="موضوع")
+    payload = models.JSONField(verbose_name="داده")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="زمان پردازش")
+
+    class Meta:
+        verbose_name = "رویداد صف خروجی"
+        verbose_name_plural = "رویدادهای صف خروجی"
+        indexes = [
+            # The dispatcher only ever reads the unprocessed tail
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} ({self.id})"
+
+
 class History(BaseModel, models.Model):
     user = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True, verbose_name="کاربر")
     book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True, verbose_name="کتاب")
@@ -0,0 +1,106 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Profile
+from library.counters import record_review
+from library.models import Book, Notification, OutboxEvent
+from library.signals import invalidate_on_commit
+
+REQUEST_DECIDED = 'request_decided'
+OUTBOX_BATCH_SIZE = 100
+
+
+def request_decided_event(request):
+    return OutboxEvent(topic=REQUEST_DECIDED, payload={
+        'request_id': request.id,
+        'user_id': request.user_id,
+        'book_id': request.book_id,
+        'type': request.type,
+        'status': request.status,
+        'score': request.reviewrequest.score if request.type == 'review' else None,
+    })
+
+
+def emit(events):
+    """
+    Writes the events in the caller's transaction, so they exist exactly when the change that
+    caused them is committed, and wakes the dispatcher once that commit happened.
+    """
+    from library.tasks import dispatch_outbox_task
+
+    OutboxEvent.objects.bulk_create(events)
+    transaction.on_commit(dispatch_outbox_task.delay)
+
+
+def dispatch_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Drains unprocessed events in batches. A batch's side effects and its processed mark commit in
+    one transaction, so a crashed worker leaves the batch to be retried rather than half applied;
+    SKIP LOCKED lets several workers drain the table without blocking on each other.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            events = list(OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                processed_at__isnull=True).order_by('id')[:batch_size])
+            if not events:
+                return total
+            handle_request_decisions([event.payload for event in events if event.topic == REQUEST_DECIDED])
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+        total += len(events)
+
+
+def handle_request_decisions(payloads):
+    if not payloads:
+        return
+    books = Book.objects.only('title').in_bulk({payload['book_id'] for payload in payloads})
+    Notification.objects.bulk_create([
+        build_request_notification(payload, books.get(payload['book_id'])) for payload in payloads
+    ])
+
+    reviews = Counter()
+    scored_reviews = Counter()
+    scores = Counter()
+    for payload in payloads:
+        if payload['type'] == 'review' and payload['status'] == 'accepted':
+            reviews[payload['book_id']] += 1
+            if payload['score'] is not None:
+                scored_reviews[payload['book_id']] += 1
+                scores[payload['book_id']] += payload['score']
+    for book_id, total in reviews.items():
+        record_review(book_id, scores[book_id], reviews=total, scored_reviews=scored_reviews[book_id])
+    if reviews:
+        invalidate_on_commit('home', *(f'book:{book_id}' for book_id in reviews))
+
+    if settings.REQUEST_DECISION_SMS:
+        send_decision_sms(payloads, books)
+
+
+def build_request_notification(payload, book):
+    request_type, status = payload['type'], payload['status']
+    return Notification(
+        user_id=payload['user_id'],
+        book=book,
+        title=f"درخواست {request_type} شما توسط ادمین {status}",
+        description=f"درخواست {request_type} شما برای کتاب {book.title if book else ''} توسط ادمین {status}",
+        type='request'
+    )
+
+
+def send_decision_sms(payloads, books):
+    from library.tasks import send_sms_task
+
+    phone_numbers = dict(Profile.objects.filter(
+        id__in={payload['user_id'] for payload in payloads}, phone_number__isnull=False,
+    ).values_list('id', 'phone_number'))
+    for payload in payloads:
+        phone_number = phone_numbers.get(payload['user_id'])
+        book = books.get(payload['book_id'])
+        if phone_number and book:
+            message = f"درخواست {payload['type']} شما برای کتاب {book.title} توسط ادمین {payload['status']}"
+            # Queued only once the batch is marked processed, so a retried batch does not text twice
+            transaction.on_commit(lambda phone_number=phone_number, message=message: send_sms_task.delay(
+                phone_number, message))
@@ -1,7 +1,12 @@
+from django.db import models
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from library.models import BorrowRequest, Book, ExtensionRequest, ReviewRequest, ReturnRequest, BaseRequestModel
+from library.holds import BOOK_RESERVED
+from library.loaders import load_request_subtypes
+from library.loans import resolve_loan_state
+from library.models import BorrowRequest, Book, ExtensionRequest, ReviewRequest, ReturnRequest, BaseRequestModel, \
+    ActiveLoan
 from library.serializers.book_serializers import SimpleBookSerializer
 from library.serializers.review_serializers import SimpleReviewSerializer
 
@@ -54,12 +59,20 @@ class ReviewRequestSerializer(serializers.ModelSerializer):
         return 'ReviewRequest'
 
 
+class RequestListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        requests = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        load_request_subtypes(requests)
+        return super().to_representation(requests)
+
+
 class UserRequestSerializer(serializers.Serializer):
     book = SimpleBookSerializer(read_only=True)
     request_detail = serializers.SerializerMethodField()
 
     class Meta:
         model = BaseRequestModel
+        list_serializer_class = RequestListSerializer
         fields = [
             'id', 'created_at', 'updated_at', 'request_detail', 'user', 'book', 'status'
         ]
@@ -89,13 +102,15 @@ class UserBorrowRequestSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         user = self.context['request'].user
-        book = self.context['view'].kwargs.get('pk')
+        book = resolve_loan_state(user, self.context['view'].kwargs.get('pk'))
 
-        if BorrowRequest.objects.filter(user=user, book=book, status='pending').exists():
+        if book.pending_borrows:
             raise ValidationError("! شما یک در خواست امانت در جریان دارید, منتظر تعیین وضعیت ادمین باشید")
-        elif BorrowRequest.objects.filter(user=user, book=book, is_finished=False).exists():
+        elif book.loan_id:
             raise ValidationError("! شما این کتاب را در اختیار دارید")
-        return data
+        elif book.reserved_for_others and book.count - book.reserved_for_others <= 0:
+            raise ValidationError(BOOK_RESERVED)
+        return {**data, 'book': book}
 
 
 class ReturnRequestSerializer(serializers.ModelSerializer):
@@ -135,18 +150,18 @@ class UserExtensionRequestSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         user = self.context['request'].user
-        book = self.context['view'].kwargs.get('pk')
+        book = resolve_loan_state(user, self.context['view'].kwargs.get('pk'))
 
-        if not BorrowRequest.objects.filter(user=user, book_id=book, status='accepted').exists():
+        if not book.loan_id:
             raise serializers.ValidationError("!شما درحال حاظر درخواست امانت درجریانی ندارید")
 
-        elif ExtensionRequest.objects.filter(user=user, book_id=book, status='pending').exists():
+        elif book.pending_extensions:
             raise serializers.ValidationError("!شما یک درخواست درحال بررسی دارید")
 
-        elif ExtensionRequest.objects.filter(user=user, book_id=book, status='accepted').exists():
+        elif book.loan_extended:
             raise serializers.ValidationError("! ارسال درخواست تمدید بیشتر از یک بار مجاز نیست")
 
-        return data
+        return {**data, 'book': book}
 
 
 class UserReturnRequestSerializer(serializers.ModelSerializer):
@@ -162,20 +177,14 @@ class UserReturnRequestSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         user = self.context['request'].user
-        book = self.context['view'].kwargs.get('pk')
+        book = resolve_loan_state(user, self.context['view'].kwargs.get('pk'))
 
-        if not BorrowRequest.objects.filter(user=user, book_id=book, is_finished=False).exists():
+        if not book.loan_id:
             raise serializers.ValidationError("!شما نمیتوانید کتابی که به امانت نبردید را تحویل دهید")
 
-        elif ReturnRequest.objects.filter(user=user, book_id=book, status='pending').exists():
+        elif book.pending_returns:
             raise serializers.ValidationError("!شما یک درخواست تحویل در جریان دارید")
-
-        elif ReturnRequest.objects.filter(user=user, book_id=book, status='accpeted').exists():
-            raise serializers.ValidationError("! شما یکبار این کتاب را تحویل دادید")
-
-        elif BaseRequestModel.objects.filter(user=user, book=book, status='pending').exists():
-            raise ValidationError("! شما یک درخواست در حال بررسی دارید")
-        return data
+        return {**data, 'book': book}
 
     def validate_score(self, value):
         if value < 0 or value > 5:
@@ -191,3 +200,15 @@ class BaseRequestSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'book', 'duration'
         ]
+
+
+class ActiveLoanSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='borrow_request_id', read_only=True)
+    book = SimpleBookSerializer(read_only=True)
+    duration = serializers.IntegerField(source='borrow_request.duration', read_only=True)
+
+    class Meta:
+        model = ActiveLoan
+        fields = [
+            'id', 'book', 'duration', 'start', 'due', 'extended'
+        ]
@@ -6,7 +6,8 @@ from library.serializers.book_serializers import  FullBookSerializerForAdminRequ
 from library.serializers.review_serializers import SimpleReviewSerializer
 from library.serializers.user_serializers import FullUserSerializer
 from library.serializers.Request_serializers import BorrowRequestSerializer, ExtensionRequestSerializer, \
-    ViewReturnRequestSerializer
+    ViewReturnRequestSerializer, RequestListSerializer
+from library.workflow import request_workflow
 
 
 class AdminRequestSerializer(serializers.ModelSerializer):
@@ -16,6 +17,7 @@ class AdminRequestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BaseRequestModel
+        list_serializer_class = RequestListSerializer
         fields = [
             'id', 'request_detail', 'user', 'book', 'status'
         ]
@@ -35,15 +37,24 @@ class AdminRequestSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def validate_status(self, value):
-        valid_status = ['accepted', 'pending']
-        request_type = self.instance.type if self.instance else self.initial_data.get('type')
+        error = request_workflow.check(self.instance, value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+
+class BulkRequestDecisionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=[('accepted', 'Accepted'), ('rejected', 'Rejected')])
+
 
-        if self.instance.status != 'pending':
-            raise serializers.ValidationError(
-                '! شما یک بار وضعیت در خواست را رد و یا تایید کردید و دیگر این امکان برای شما فراهم نیست')
+class BulkRequestDecisionListSerializer(serializers.Serializer):
+    items = BulkRequestDecisionSerializer(many=True, allow_empty=False, max_length=500)
 
-        if request_type == 'return' and value not in valid_status:
-            raise serializers.ValidationError("!وضعیت برای درخواست تحویل امکان رد شدن ندارد")
+    def validate_items(self, value):
+        ids = [item['id'] for item in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('! هر درخواست فقط یک بار می تواند در لیست باشد')
         return value
 
 
@@ -33,7 +33,7 @@ class FullBookSerializer(serializers.ModelSerializer):
         model = Book
         fields = [
             'id', 'title', 'image', 'author', 'translator', 'publisher', 'volume_number', 'publication_year',
-            'page_count', 'owner', 'description', 'count', 'category'
+            'page_count', 'owner', 'description', 'count', 'category', 'average_score'
         ]
 
     def get_count(self, obj):
@@ -52,7 +52,7 @@ class SingleBookUserSerializer(serializers.ModelSerializer):
         model = Book
         fields = [
             'id', 'title', 'image', 'author', 'translator', 'publisher', 'volume_number', 'publication_year',
-            'page_count', 'owner', 'description', 'count', 'category', 'remaining_days'
+            'page_count', 'owner', 'description', 'count', 'category', 'average_score', 'remaining_days'
         ]
 
     def get_count(self, obj):
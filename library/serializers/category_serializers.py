@@ -5,12 +5,14 @@ from library.models import Category
 class SimpleCategoryListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'title', 'parent']
+        fields = ['id', 'title', 'parent', 'book_total', 'available_total']
 
     def validate_parent(self, value):
         if self.instance:  # Ensure we're updating, not creating
             if value == self.instance:
                 raise serializers.ValidationError('! کتگوری نمی تواند زیرکتگوری خودش باشد')
+            if value and self.instance.path and value.path.startswith(self.instance.path):
+                raise serializers.ValidationError('! کتگوری نمی تواند زیرکتگوری زیرمجموعه‌های خودش باشد')
         return value
 
     def validate_title(self, value):
@@ -25,11 +27,12 @@ class CategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = ['id', 'title', 'parent', 'children']
+        fields = ['id', 'title', 'parent', 'book_total', 'available_total', 'children']
         read_only_fields = ['children']
 
     def get_children(self, obj):
-        children = obj.children.all()
+        # Trees built by library.hierarchy carry their children already, so no query per node
+        children = obj.tree_children if hasattr(obj, 'tree_children') else obj.children.all()
         if children:
             return CategorySerializer(children, many=True).data
         return None
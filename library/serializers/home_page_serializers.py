@@ -1,3 +1,4 @@
+from django.db import models
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
@@ -5,7 +6,11 @@ import jdatetime
 
 from codinto_library import settings
 from core.models import Profile
-from library.models import Book, ReviewRequest, Notification, Category
+from library.hierarchy import load_category_ancestors
+from library.models import Book, BookHold, ReviewRequest, Category
+
+
+HOLD_ALREADY_EXISTS = '! شما یکبار درخواست موجود شد به من اطلاع بدید رو انتخاب کردید'
 
 
 class BookSerializer(serializers.ModelSerializer):
@@ -42,6 +47,13 @@ class BookDetailSerializer(serializers.ModelSerializer):
         return ReviewSerializer(accepted_reviews, many=True).data
 
 
+class BookCategoryListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        books = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        load_category_ancestors([book.category for book in books])
+        return super().to_representation(books)
+
+
 class BookListSerializerForAdmin(serializers.ModelSerializer):
     owner = serializers.PrimaryKeyRelatedField(queryset=Profile.objects.all())
     # count = serializers.SerializerMethodField()
@@ -59,6 +71,7 @@ class BookListSerializerForAdmin(serializers.ModelSerializer):
             'description', 'count', 'category_id', 'categories'
         ]
         extra_kwargs = {'category': {'required': True}}
+        list_serializer_class = BookCategoryListSerializer
 
     # def get_count(self, obj):
     #     if obj.count > 0:
@@ -87,16 +100,20 @@ class BookListSerializerForAdmin(serializers.ModelSerializer):
         return value
 
     def get_categories(self, obj):
-        def build_hierarchy(category):
-            if category is None:
-                return None
-            return {
+        if obj.category is None:
+            return None
+        ancestors = getattr(obj.category, 'ancestors', None)
+        if ancestors is None:
+            ancestors = obj.category.get_ancestors()
+
+        hierarchy = None
+        for category in ancestors:
+            hierarchy = {
                 'id': category.id,
                 'title': category.title,
-                'parent': build_hierarchy(category.parent)
+                'parent': hierarchy
             }
-
-        return build_hierarchy(obj.category)
+        return hierarchy
 
 
 class BookSerializerForAdmin(serializers.ModelSerializer):
@@ -127,12 +144,20 @@ class BookSerializerForAdmin(serializers.ModelSerializer):
 
 class BookAvailableRemainderSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Notification
+        model = BookHold
         fields = []
 
     def validate(self, attrs):
         user = self.context['request'].user
         book = self.context['view'].kwargs.get('pk')
-        if Notification.objects.filter(user=user, book=book, type='available').exists():
-            raise ValidationError('! شما یکبار درخواست موجود شد به من اطلاع بدید رو انتخاب کردید')
+        if BookHold.objects.filter(user=user, book=book, status__in=BookHold.ACTIVE_STATUSES).exists():
+            raise ValidationError(HOLD_ALREADY_EXISTS)
         return attrs
+
+
+class BookHoldSerializer(serializers.ModelSerializer):
+    position = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = BookHold
+        fields = ['id', 'status', 'position', 'offered_at', 'offer_expires_at']
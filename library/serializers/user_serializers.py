@@ -2,7 +2,8 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from core.models import Profile
-from library.models import ReviewRequest, ReturnRequest
+from library.loans import resolve_loan_state
+from library.models import ReviewRequest
 
 
 class FullUserSerializer(serializers.ModelSerializer):
@@ -32,13 +33,13 @@ class UserCreateReviewSerializer(serializers.ModelSerializer):
     def validate(self, data):
 
         user = self.context['request'].user
-        book = self.context['view'].kwargs.get('pk')
+        book = resolve_loan_state(user, self.context['view'].kwargs.get('pk'))
 
-        if ReviewRequest.objects.filter(user=user, book=book).exists():
+        if book.reviews:
             raise ValidationError('! شما برای این کتاب نظر ثبت کردید')
-        elif not ReturnRequest.objects.filter(user=user, book=book, status='accepted').exists():
+        elif not book.accepted_returns:
             raise ValidationError("! شما ابتدا باید مطالعه این کتاب را به پایان برسانید")
-        return data
+        return {**data, 'book': book}
 
     def validate_score(self, value):
         if value is None:
@@ -0,0 +1,66 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_migrate
+from django.dispatch import receiver
+
+from library.caching import invalidate_tags
+from library.models import Book, Category, BaseRequestModel, BorrowRequest, ExtensionRequest, ReviewRequest, \
+    ReturnRequest
+
+REQUEST_MODELS = [BaseRequestModel, BorrowRequest, ExtensionRequest, ReviewRequest, ReturnRequest]
+
+
+@receiver(pre_migrate)
+def create_postgres_extensions(sender, using, **kwargs):
+    # The trigram indexes on Book and Profile need pg_trgm; pre_migrate runs for every app before any migration
+    if sender.name != 'library':
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+def invalidate_on_commit(*tags):
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_caches(sender, instance, **kwargs):
+    tags = ['home', 'books', f'book:{instance.pk}']
+    if instance.category_id:
+        tags.append(f'category:{instance.category_id}')
+    # Inventory and counter writes leave the suggestion index alone; raw saves skip Book.save and count as changes
+    if kwargs['signal'] is post_delete or getattr(instance, '_titles_changed', True):
+        tags.append('book-titles')
+    invalidate_on_commit(*tags)
+
+
+@receiver(post_delete, sender=Book)
+def update_category_totals_on_book_delete(sender, instance, **kwargs):
+    Category.shift_book_totals(instance.category_id, -1, -instance.count)
+
+
+@receiver(pre_delete, sender=Category)
+def reroot_category_subtree(sender, instance, **kwargs):
+    # Children become roots once the parent is gone (on_delete=SET_NULL), so their paths lose its prefix
+    # and the ancestors lose the whole subtree from their totals. The stored row is re-read because
+    # deleting an ancestor in the same batch may have moved it already
+    row = Category.objects.filter(pk=instance.pk).values_list('path', 'book_total', 'available_total').first()
+    if row and row[0]:
+        path, books, copies = row
+        Category.shift_totals(path, -books, -copies, include_self=False)
+        Category.move_subtree(path, '')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_caches(sender, instance, **kwargs):
+    invalidate_on_commit('categories', 'category-totals', f'category:{instance.pk}')
+
+
+def invalidate_request_caches(sender, instance, **kwargs):
+    # Only accepted requests reach the cached pages (rankings, book reviews); new and rejected ones leave them alone
+    if instance.status == 'accepted':
+        invalidate_on_commit('home', f'book:{instance.book_id}')
+
+
+for request_model in REQUEST_MODELS:
+    post_save.connect(invalidate_request_caches, sender=request_model)
+    post_delete.connect(invalidate_request_caches, sender=request_model)
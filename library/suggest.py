@@ -0,0 +1,109 @@
+import threading
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from core.normalizers import normalize_persian
+from library.caching import get_tag_versions
+from library.models import Book
+
+SUGGESTION_LIMIT = 10
+SUGGESTION_INDEX_TIMEOUT = 60 * 60 * 24 * 7
+SUGGESTION_BUILD_TIMEOUT = 60 * 5
+
+
+class BookSuggester:
+    """
+    Keeps a lexicographically sorted list of normalized title/author keys in process memory and
+    answers prefix lookups with a binary search. The 'book-titles' cache tag moves when a book is
+    created or deleted or its title or author changes; the index for the new version is built by
+    rebuild_suggestions_task and shared through the cache backend, and until it lands every
+    process keeps answering from the index it already has.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        prefix = normalize_persian(prefix)
+        if not prefix:
+            return []
+
+        keys, entries = self._load()
+        suggestions = []
+        seen = set()
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix) and len(suggestions) < limit:
+            suggestion_type, value = entries[position]
+            if (suggestion_type, value) not in seen:
+                seen.add((suggestion_type, value))
+                suggestions.append({'type': suggestion_type, 'value': value})
+            position += 1
+        return suggestions
+
+    def _load(self):
+        [version] = get_tag_versions(['book-titles'])
+        if version == self._version:
+            return self._index
+
+        with self._lock:
+            if version != self._version:
+                index = cache.get(f'book-suggest:{version}')
+                if index is not None:
+                    self._version, self._index = version, index
+                    return self._index
+
+                if self._index is None:
+                    # A process that starts before the new index lands serves the last shared one
+                    self._index = cache.get('book-suggest:latest')
+                if self._index is None:
+                    # Only an empty cache backend makes a request build the index itself
+                    self._version, self._index = rebuild_suggestions()
+                else:
+                    self._schedule(version)
+        return self._index
+
+    @staticmethod
+    def _schedule(version):
+        from library.tasks import rebuild_suggestions_task
+
+        # One build per version however many processes notice the move; the lock expires so a
+        # lost task is retried by a later request
+        if cache.add(f'book-suggest-build:{version}', True, SUGGESTION_BUILD_TIMEOUT):
+            rebuild_suggestions_task.delay()
+
+
+def build_suggestions():
+    rows = []
+    for title, title_key, author, author_key in Book.objects.values_list(
+            'title', 'title_key', 'author', 'author_key').iterator():
+        rows.extend(_word_keys(title_key, ('title', title)))
+        rows.extend(_word_keys(author_key, ('author', author)))
+    rows.sort(key=lambda row: row[0])
+    return [key for key, entry in rows], [entry for key, entry in rows]
+
+
+def rebuild_suggestions():
+    """
+    Builds the index for the current 'book-titles' version and shares it through the cache. The
+    version is read before the catalog, so a change that commits meanwhile moves the tag again and
+    gets a build of its own.
+    """
+    [version] = get_tag_versions(['book-titles'])
+    index = build_suggestions()
+    cache.set_many({
+        f'book-suggest:{version}': index,
+        'book-suggest:latest': index,
+    }, SUGGESTION_INDEX_TIMEOUT)
+    return version, index
+
+
+def _word_keys(key, entry):
+    # Every word start is indexed, so typing the second word of a title still completes it
+    words = key.split(' ')
+    return [(' '.join(words[index:]), entry) for index in range(len(words)) if words[index]]
+
+
+book_suggester = BookSuggester()
@@ -3,8 +3,12 @@ from datetime import timedelta
 from celery import shared_task
 from django.utils import timezone
 
-from codinto_library.utils import send_sms
-from library.models import BorrowRequest
+from codinto_library.utils import send_bulk_sms, send_sms
+from library.counters import rebuild_book_counters
+from library.holds import expire_offers, offer_copies
+from library.models import ActiveLoan
+from library.outbox import dispatch_outbox
+from library.suggest import rebuild_suggestions
 
 
 @shared_task
@@ -12,14 +16,19 @@ def send_sms_task(phone_number, message):
     send_sms(phone_number, message)
 
 
+@shared_task
+def send_bulk_sms_task(numbers, message):
+    send_bulk_sms(numbers, message)
+
+
 @shared_task
 def check_legal_borrow_date():
     today = timezone.now()
 
-    requests = BorrowRequest.objects.filter(status='accepted', end_date__gte=today - timedelta(days=3))
+    loans = ActiveLoan.objects.filter(due__gte=today - timedelta(days=3)).select_related('user', 'book')
 
-    for request in requests:
-        days_left = (request.end_date - today).days
+    for request in loans:
+        days_left = (request.due - today).days
         user = request.user
 
         if days_left == 3:
@@ -40,3 +49,28 @@ def check_legal_borrow_date():
             continue
 
         send_sms_task.delay(user.phone_number, message)
+
+
+@shared_task
+def refresh_book_counters():
+    rebuild_book_counters()
+
+
+@shared_task
+def dispatch_outbox_task():
+    return dispatch_outbox()
+
+
+@shared_task
+def expire_hold_offers():
+    return expire_offers()
+
+
+@shared_task
+def offer_copies_task(book_id):
+    return offer_copies(book_id)
+
+
+@shared_task
+def rebuild_suggestions_task():
+    return rebuild_suggestions()[0]
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from model_bakery import baker
 from rest_framework.test import APIClient
 import pytest
@@ -5,6 +6,13 @@ from core.utils import create_test_image
 from core.models import Profile
 
 
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
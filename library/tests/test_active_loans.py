@@ -0,0 +1,80 @@
+from django.core.management import call_command
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from core.models import Profile
+from library.models import ActiveLoan, Book, BorrowRequest, ExtensionRequest, ReturnRequest
+
+
+@pytest.mark.django_db
+class TestActiveLoanLifecycle:
+    def test_if_approval_workflow_opens_extends_and_closes_loan(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        user = baker.make(Profile)
+        book = baker.make(Book, count=1)
+        borrow = baker.make(BorrowRequest, user=user, book=book, time=14, type='borrow')
+
+        api_client.put(f'/super-user/requests/{borrow.id}/', data={'status': 'accepted'})
+        loan = ActiveLoan.objects.get(user=user, book=book)
+        assert not loan.extended
+        assert (loan.due - loan.start).days == 14
+
+        extension = baker.make(ExtensionRequest, user=user, book=book, time=5, type='extension')
+        api_client.put(f'/super-user/requests/{extension.id}/', data={'status': 'accepted'})
+        loan.refresh_from_db()
+        assert loan.extended
+        assert (loan.due - loan.start).days == 19
+
+        return_request = baker.make(ReturnRequest, user=user, book=book, type='return')
+        api_client.put(f'/super-user/requests/{return_request.id}/', data={'status': 'accepted'})
+        assert not ActiveLoan.objects.exists()
+
+    def test_if_rebuild_recreates_loans_from_borrows(self):
+        borrow = baker.make(BorrowRequest, time=14, type='borrow', status='accepted')
+        baker.make(BorrowRequest, time=14, type='borrow', status='accepted', is_finished=True)
+        baker.make(BorrowRequest, time=14, type='borrow', status='rejected')
+
+        call_command('rebuild_active_loans')
+
+        assert list(ActiveLoan.objects.values_list('borrow_request_id', flat=True)) == [borrow.id]
+
+
+@pytest.mark.django_db
+class TestLoanEligibility:
+    def test_if_rejected_borrow_does_not_block_new_borrow(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+        baker.make(BorrowRequest, user=user, book=book, time=14, type='borrow', status='rejected')
+
+        response = api_client.post(f'/user/books/{book.id}/borrow/', data={'time': 14})
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_if_held_book_cannot_be_borrowed_again(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+        baker.make(ActiveLoan, user=user, book=book)
+
+        response = api_client.post(f'/user/books/{book.id}/borrow/', data={'time': 14})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_extended_loan_cannot_be_extended_again(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+        baker.make(ActiveLoan, user=user, book=book, extended=True)
+
+        response = api_client.post(f'/user/books/{book.id}/extension/', data={'time': 3})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_my_books_lists_active_loans(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        loan = baker.make(ActiveLoan, user=user)
+        baker.make(ActiveLoan)
+
+        response = api_client.get('/user/my-books/')
+
+        assert [item['book']['id'] for item in response.data['results']] == [loan.book_id]
+        assert response.data['results'][0]['id'] == loan.borrow_request_id
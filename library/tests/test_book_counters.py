@@ -0,0 +1,161 @@
+import threading
+
+from django.core.management import call_command
+from django.db import connection
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from core.models import Profile
+from library.models import Book, BorrowRequest, ReviewRequest, ReturnRequest
+from library.counters import borrow_copy, return_copy
+from library.outbox import dispatch_outbox, emit, request_decided_event
+from library.tasks import refresh_book_counters
+
+
+@pytest.mark.django_db
+class TestRebuildBookCounters:
+    def test_if_counters_count_only_accepted_requests(self):
+        book = baker.make(Book)
+        baker.make(BorrowRequest, book=book, time=14, type='borrow', status='accepted', _quantity=2)
+        baker.make(BorrowRequest, book=book, time=14, type='borrow', status='accepted', is_finished=True)
+        baker.make(BorrowRequest, book=book, time=14, type='borrow', status='pending')
+        baker.make(ReviewRequest, book=book, type='review', status='accepted', score=4)
+        baker.make(ReviewRequest, book=book, type='review', status='accepted', score=1)
+        baker.make(ReviewRequest, book=book, type='review', status='pending', score=5)
+
+        refresh_book_counters()
+
+        book.refresh_from_db()
+        assert book.borrow_count == 3
+        assert book.active_loan_count == 2
+        assert book.review_count == 2
+        assert book.score_total == 5
+        assert book.average_score == 2.5
+
+    def test_if_unscored_reviews_stay_out_of_the_average(self):
+        book = baker.make(Book)
+        for score in (4, None, 2):
+            review = baker.make(ReviewRequest, user=baker.make(Profile), book=book, type='review', score=score,
+                                status='accepted')
+            emit([request_decided_event(review)])
+        dispatch_outbox()
+        book.refresh_from_db()
+        live = (book.review_count, book.scored_review_count, book.average_score)
+
+        refresh_book_counters()
+
+        book.refresh_from_db()
+        assert live == (3, 2, 3)
+        assert (book.review_count, book.scored_review_count, book.average_score) == live
+
+    def test_if_command_resets_stale_counters_in_chunks(self):
+        books = baker.make(Book, borrow_count=42, review_count=7, _quantity=3)
+
+        call_command('rebuild_book_counters', '--chunk-size', '2')
+
+        assert not Book.objects.filter(id__in=[book.id for book in books], borrow_count__gt=0).exists()
+        assert not Book.objects.filter(id__in=[book.id for book in books], review_count__gt=0).exists()
+
+    def test_if_saving_stale_book_keeps_counters(self):
+        book = baker.make(Book, count=1)
+        stale = Book.objects.get(pk=book.pk)
+        Book.objects.filter(pk=book.pk).update(borrow_count=5, review_count=2, score_total=7, average_score=3.5)
+
+        stale.title = 'عنوان تازه'
+        stale.save()
+
+        book.refresh_from_db()
+        assert book.title == 'عنوان تازه'
+        assert (book.borrow_count, book.review_count, book.score_total, book.average_score) == (5, 2, 7, 3.5)
+
+
+@pytest.mark.django_db
+class TestBookCountersOnApproval:
+    def test_if_home_page_is_ordered_by_counters(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        popular_book = baker.make(Book, borrow_count=5, review_count=0)
+        other_book = baker.make(Book, borrow_count=1, review_count=3)
+
+        response = api_client.get('/user/home/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [book['id'] for book in response.data['most_borrowed_books']] == [popular_book.id, other_book.id]
+        assert [book['id'] for book in response.data['highest_rated_books']] == [other_book.id, popular_book.id]
+
+    def test_if_accepting_borrow_and_return_updates_counters(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        user = baker.make(Profile)
+        book = baker.make(Book, count=1)
+        borrow = baker.make(BorrowRequest, user=user, book=book, time=14, type='borrow')
+
+        api_client.put(f'/super-user/requests/{borrow.id}/', data={'status': 'accepted'})
+        book.refresh_from_db()
+        assert book.borrow_count == 1
+        assert book.active_loan_count == 1
+
+        return_request = baker.make(ReturnRequest, user=user, book=book, type='return')
+        api_client.put(f'/super-user/requests/{return_request.id}/', data={'status': 'accepted'})
+        book.refresh_from_db()
+        assert book.borrow_count == 1
+        assert book.active_loan_count == 0
+
+    def test_if_accepting_review_updates_average_score(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        book = baker.make(Book, review_count=1, scored_review_count=1, score_total=5, average_score=5)
+        review = baker.make(ReviewRequest, user=baker.make(Profile), book=book, type='review', score=2)
+
+        response = api_client.put(f'/super-user/requests/{review.id}/', data={'status': 'accepted'})
+        dispatch_outbox()
+
+        assert response.status_code == status.HTTP_200_OK
+        book.refresh_from_db()
+        assert book.review_count == 2
+        assert book.average_score == 3.5
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAtomicInventory:
+    def run_concurrently(self, target, threads):
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def worker():
+            try:
+                barrier.wait()
+                results.append(target())
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def test_if_concurrent_borrows_never_oversell(self):
+        book = baker.make(Book, count=3)
+
+        results = self.run_concurrently(lambda: borrow_copy(book.id, book.category_id), threads=10)
+
+        book.refresh_from_db()
+        assert results.count(True) == 3
+        assert book.count == 0
+        assert book.borrow_count == 3
+
+    def test_if_concurrent_returns_are_all_counted(self):
+        book = baker.make(Book, count=0, active_loan_count=5)
+
+        self.run_concurrently(lambda: return_copy(book.id, book.category_id), threads=5)
+
+        book.refresh_from_db()
+        assert book.count == 5
+        assert book.active_loan_count == 0
+
+    def test_if_rejected_borrow_leaves_inventory_untouched(self):
+        book = baker.make(Book, count=0)
+
+        assert not borrow_copy(book.id, book.category_id)
+        book.refresh_from_db()
+        assert book.count == 0
@@ -0,0 +1,138 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from core.models import Profile
+from library.models import ActiveLoan, Book, BorrowRequest, Category, ExtensionRequest, Notification, OutboxEvent, \
+    ReviewRequest, ReturnRequest
+from library import tasks
+from library.outbox import dispatch_outbox
+
+
+@pytest.fixture
+def post_bulk(api_client, staff_user):
+    api_client.force_authenticate(user=staff_user)
+
+    def post(items):
+        return api_client.post('/super-user/requests/bulk/', data={'items': items}, format='json')
+
+    return post
+
+
+@pytest.mark.django_db
+class TestBulkRequestDecisions:
+    def test_if_non_admin_returns_403(self, api_client, user):
+        api_client.force_authenticate(user=user)
+
+        response = api_client.post('/super-user/requests/bulk/', data={'items': []}, format='json')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_if_duplicate_ids_return_400(self, post_bulk):
+        response = post_bulk([{'id': 1, 'status': 'accepted'}, {'id': 1, 'status': 'rejected'}])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_borrows_are_accepted_until_copies_run_out(self, post_bulk, user):
+        category = baker.make(Category)
+        book = baker.make(Book, count=2, category=category)
+        borrows = [baker.make(BorrowRequest, user=baker.make(Profile), book=book, type='borrow', time=14)
+                   for _ in range(3)]
+
+        response = post_bulk([{'id': borrow.id, 'status': 'accepted'} for borrow in borrows])
+        dispatch_outbox()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['success'] for item in response.data['results']] == [True, True, False]
+        book.refresh_from_db()
+        assert (book.count, book.borrow_count, book.active_loan_count) == (0, 2, 2)
+        category.refresh_from_db()
+        assert category.available_total == 0
+        assert BorrowRequest.objects.filter(status='accepted', end_date__isnull=False).count() == 2
+        assert Notification.objects.filter(type='request').count() == 2
+        assert ActiveLoan.objects.filter(book=book).count() == 2
+
+    def test_if_borrow_of_held_book_is_refused(self, post_bulk, user):
+        book = baker.make(Book, count=5)
+        loan = baker.make(ActiveLoan, user=user, book=book)
+        borrow = baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14)
+
+        response = post_bulk([{'id': borrow.id, 'status': 'accepted'}])
+
+        assert response.data['results'][0]['success'] is False
+        assert ActiveLoan.objects.get(user=user, book=book) == loan
+
+    def test_if_mixed_decisions_apply_in_one_call(self, post_bulk, user):
+        book = baker.make(Book, count=0, active_loan_count=1)
+        baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='accepted')
+        returned = baker.make(ReturnRequest, user=user, book=book, type='return')
+        review = baker.make(ReviewRequest, user=user, book=book, type='review', score=4)
+        extension = baker.make(ExtensionRequest, user=baker.make(Profile), book=book, type='extension', time=5)
+        rejected = baker.make(BorrowRequest, user=baker.make(Profile), book=book, type='borrow', time=14)
+
+        response = post_bulk([
+            {'id': returned.id, 'status': 'accepted'},
+            {'id': review.id, 'status': 'accepted'},
+            {'id': extension.id, 'status': 'accepted'},
+            {'id': rejected.id, 'status': 'rejected'},
+        ])
+        dispatch_outbox()
+
+        assert all(item['success'] for item in response.data['results'])
+        book.refresh_from_db()
+        assert (book.count, book.active_loan_count, book.review_count, book.average_score) == (1, 0, 1, 4)
+        assert BorrowRequest.objects.get(status='accepted').is_finished
+        extension.refresh_from_db()
+        assert extension.duration == 5
+        rejected.refresh_from_db()
+        assert rejected.status == 'rejected'
+
+    def test_if_invalid_items_are_reported_per_item(self, post_bulk, user):
+        book = baker.make(Book, count=1)
+        decided = baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='rejected')
+        returned = baker.make(ReturnRequest, user=user, book=book, type='return')
+
+        response = post_bulk([
+            {'id': decided.id, 'status': 'accepted'},
+            {'id': returned.id, 'status': 'rejected'},
+            {'id': returned.id + 100, 'status': 'accepted'},
+        ])
+
+        assert [item['success'] for item in response.data['results']] == [False, False, False]
+        assert not OutboxEvent.objects.exists()
+
+    def test_if_query_count_does_not_grow_with_items(self, post_bulk):
+        def accept_borrows(quantity):
+            # A book and a category per item, so no per-book or per-category statement can hide
+            borrows = [baker.make(BorrowRequest, user=baker.make(Profile), type='borrow', time=14,
+                                  book=baker.make(Book, count=1, category=baker.make(Category)))
+                       for _ in range(quantity)]
+            with CaptureQueriesContext(connection) as captured:
+                response = post_bulk([{'id': borrow.id, 'status': 'accepted'} for borrow in borrows])
+            assert all(item['success'] for item in response.data['results'])
+            return len(captured)
+
+        assert accept_borrows(2) == accept_borrows(20)
+
+    def test_if_returns_are_offered_and_rolled_up_per_category(self, post_bulk, monkeypatch,
+                                                              django_capture_on_commit_callbacks):
+        offered = []
+        monkeypatch.setattr(tasks.offer_copies_task, 'delay', offered.append)
+        parent = baker.make(Category)
+        child = baker.make(Category, parent=parent)
+        books = baker.make(Book, count=0, active_loan_count=2, category=child, _quantity=2)
+        returns = []
+        for book in books:
+            for _ in range(2):
+                user = baker.make(Profile)
+                baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='accepted')
+                returns.append(baker.make(ReturnRequest, user=user, book=book, type='return'))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_bulk([{'id': returned.id, 'status': 'accepted'} for returned in returns])
+
+        assert sorted(offered) == sorted(book.id for book in books)
+        assert list(Category.objects.filter(id__in=[parent.id, child.id]).values_list(
+            'available_total', flat=True)) == [4, 4]
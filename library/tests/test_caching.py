@@ -0,0 +1,127 @@
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from library.models import ActiveLoan, BaseRequestModel, Book, BorrowRequest, Category, ReviewRequest
+
+
+@pytest.mark.django_db
+class TestResponseCache:
+    def test_if_repeated_home_page_read_does_not_query_database(self, api_client, user,
+                                                                django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        baker.make(Book, _quantity=3)
+        first_response = api_client.get('/user/home/')
+
+        with django_assert_num_queries(0):
+            second_response = api_client.get('/user/home/')
+
+        assert second_response.status_code == status.HTTP_200_OK
+        assert second_response.data == first_response.data
+
+    def test_if_saving_book_invalidates_book_list(self, api_client, user, django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book, title='old title')
+        api_client.get('/user/books/')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            book.title = 'new title'
+            book.save()
+        response = api_client.get('/user/books/')
+
+        assert response.data['results'][0]['title'] == 'new title'
+
+    def test_if_accepted_review_invalidates_only_its_book(self, api_client, user,
+                                                          django_capture_on_commit_callbacks,
+                                                          django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        book, other_book = baker.make(Book, _quantity=2)
+        api_client.get(f'/user/books/{book.id}/reviews/')
+        api_client.get(f'/user/books/{other_book.id}/reviews/')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            baker.make(ReviewRequest, book=book, user=user, type='review', status='accepted', score=5)
+        response = api_client.get(f'/user/books/{book.id}/reviews/')
+
+        assert response.data['count'] == 1
+        with django_assert_num_queries(0):
+            api_client.get(f'/user/books/{other_book.id}/reviews/')
+
+    def test_if_pending_request_keeps_book_caches(self, api_client, user, django_capture_on_commit_callbacks,
+                                                  django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+        api_client.get(f'/user/books/{book.id}/reviews/')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            baker.make(ReviewRequest, book=book, user=user, type='review', score=5)
+        with django_assert_num_queries(0):
+            api_client.get(f'/user/books/{book.id}/reviews/')
+
+    def test_if_category_write_invalidates_nested_tree(self, api_client, staff_user,
+                                                       django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user=staff_user)
+        parent = baker.make(Category)
+        api_client.get('/category/nested/')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            baker.make(Category, parent=parent)
+        response = api_client.get('/category/nested/')
+
+        assert response.data[0]['children'] is not None
+
+
+@pytest.mark.django_db
+class TestIdempotencyKeys:
+    def test_if_retried_borrow_replays_response_without_database_work(self, api_client, user,
+                                                                      django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book, count=1)
+        first_response = api_client.post(f'/user/books/{book.id}/borrow/', {'time': 14},
+                                         HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        with django_assert_num_queries(0):
+            second_response = api_client.post(f'/user/books/{book.id}/borrow/', {'time': 14},
+                                              HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        assert first_response.status_code == second_response.status_code == status.HTTP_201_CREATED
+        assert second_response.data == first_response.data
+        assert second_response['Idempotent-Replayed'] == 'true'
+        assert BorrowRequest.objects.filter(user=user, book=book).count() == 1
+
+    def test_if_return_retry_does_not_duplicate_review(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+        borrow = baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='accepted')
+        baker.make(ActiveLoan, user=user, book=book, borrow_request=borrow)
+        data = {'score': 4, 'description': 'good'}
+        first_response = api_client.post(f'/user/books/{book.id}/return/', data, HTTP_IDEMPOTENCY_KEY='return-1')
+        # Once the first attempt is decided nothing is pending, so only the key keeps the retry from running again
+        BaseRequestModel.objects.filter(user=user, book=book, status='pending').update(status='rejected')
+
+        second_response = api_client.post(f'/user/books/{book.id}/return/', data, HTTP_IDEMPOTENCY_KEY='return-1')
+
+        assert first_response.status_code == second_response.status_code == status.HTTP_201_CREATED
+        assert second_response.data == first_response.data
+        assert second_response['Idempotent-Replayed'] == 'true'
+        assert ReviewRequest.objects.filter(user=user, book=book).count() == 1
+
+    def test_if_reused_key_with_other_body_is_refused(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book, count=1)
+        api_client.post(f'/user/books/{book.id}/borrow/', {'time': 14}, HTTP_IDEMPOTENCY_KEY='retry-2')
+
+        response = api_client.post(f'/user/books/{book.id}/borrow/', {'time': 30}, HTTP_IDEMPOTENCY_KEY='retry-2')
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_if_failed_attempt_is_not_stored(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book, count=1)
+
+        first_response = api_client.post(f'/user/books/{book.id}/borrow/', {'time': 1}, HTTP_IDEMPOTENCY_KEY='retry-3')
+        second_response = api_client.post(f'/user/books/{book.id}/borrow/', {'time': 1},
+                                          HTTP_IDEMPOTENCY_KEY='retry-3')
+
+        assert first_response.status_code == second_response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Idempotent-Replayed' not in second_response
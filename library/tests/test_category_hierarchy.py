@@ -0,0 +1,298 @@
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from library.hierarchy import rebuild_category_paths, rebuild_category_totals
+from library.models import Book, Category
+
+
+def make_chain(depth):
+    categories = []
+    parent = None
+    for _ in range(depth):
+        parent = baker.make(Category, parent=parent)
+        categories.append(parent)
+    return categories
+
+
+@pytest.mark.django_db
+class TestCategoryPath:
+    def test_if_path_lists_ancestors(self):
+        root, child, grandchild = make_chain(3)
+
+        grandchild.refresh_from_db()
+        assert grandchild.path == f'{root.id}/{child.id}/{grandchild.id}/'
+        assert list(grandchild.get_ancestors()) == [root, child, grandchild]
+        assert set(root.get_descendants()) == {child, grandchild}
+
+    def test_if_moving_category_moves_its_subtree(self):
+        root, child, grandchild = make_chain(3)
+        other_root = baker.make(Category)
+
+        child.parent = other_root
+        child.save()
+
+        grandchild.refresh_from_db()
+        assert grandchild.path == f'{other_root.id}/{child.id}/{grandchild.id}/'
+        assert not root.get_descendants().exists()
+
+    def test_if_failed_move_leaves_the_subtree_in_place(self, monkeypatch):
+        root, child, grandchild = make_chain(3)
+        other_root = baker.make(Category)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError
+        monkeypatch.setattr(Category, 'shift_totals', staticmethod(fail))
+        child.parent = other_root
+        with pytest.raises(RuntimeError):
+            child.save()
+
+        assert Category.objects.get(pk=child.pk).parent_id == root.id
+        assert Category.objects.get(pk=grandchild.pk).path == f'{root.id}/{child.id}/{grandchild.id}/'
+
+    def test_if_deleting_category_reroots_its_children(self):
+        root, child, grandchild = make_chain(3)
+
+        child.delete()
+
+        grandchild.refresh_from_db()
+        assert grandchild.parent is None
+        assert grandchild.path == f'{grandchild.id}/'
+
+    def test_if_rebuild_restores_paths(self):
+        root, child, grandchild = make_chain(3)
+        Category.objects.update(path='')
+
+        rebuild_category_paths()
+
+        grandchild.refresh_from_db()
+        assert grandchild.path == f'{root.id}/{child.id}/{grandchild.id}/'
+
+
+@pytest.mark.django_db
+class TestCategoryTreeQueries:
+    def test_if_nested_tree_loads_in_constant_queries(self, api_client, staff_user, django_assert_num_queries):
+        api_client.force_authenticate(user=staff_user)
+        make_chain(5)
+        make_chain(2)
+
+        # The tree structure and the totals
+        with django_assert_num_queries(2):
+            response = api_client.get('/category/nested/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 2
+        depth, node = 0, response.data[0]
+        while node['children']:
+            depth, node = depth + 1, node['children'][0]
+        assert depth == 4
+
+    def test_if_admin_book_list_shows_deep_hierarchy(self, api_client, staff_user, django_assert_num_queries):
+        api_client.force_authenticate(user=staff_user)
+        chain = make_chain(5)
+        baker.make(Book, category=chain[-1], _quantity=3)
+
+        # page count + books with categories + ancestors of every category on the page
+        with django_assert_num_queries(3):
+            response = api_client.get('/super-user/books/')
+
+        hierarchy = response.data['results'][0]['categories']
+        titles = []
+        while hierarchy:
+            titles.append(hierarchy['title'])
+            hierarchy = hierarchy['parent']
+        assert titles == [category.title for category in reversed(chain)]
+
+    def test_if_category_cannot_move_under_its_descendant(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        root, child = make_chain(2)
+
+        response = api_client.put(f'/category/{root.id}/', data={'title': 'new title', 'parent': child.id})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestCachedCategoryTree:
+    def test_if_warm_tree_is_served_without_queries(self, api_client, staff_user, django_assert_num_queries):
+        api_client.force_authenticate(user=staff_user)
+        make_chain(3)
+        first_response = api_client.get('/category/nested/')
+
+        with django_assert_num_queries(0):
+            second_response = api_client.get('/category/nested/')
+
+        assert second_response.data == first_response.data
+        assert second_response['ETag'] == first_response['ETag']
+
+    def test_if_matching_etag_returns_not_modified(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        make_chain(2)
+        etag = api_client.get('/category/nested/')['ETag']
+
+        response = api_client.get('/category/nested/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not response.content
+
+    def test_if_category_write_changes_etag(self, api_client, staff_user, django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user=staff_user)
+        root, = make_chain(1)
+        etag = api_client.get('/category/nested/')['ETag']
+
+        with django_capture_on_commit_callbacks(execute=True):
+            baker.make(Category, parent=root)
+        response = api_client.get('/category/nested/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        assert len(response.data[0]['children']) == 1
+
+    def test_if_inventory_change_only_reloads_totals(self, api_client, staff_user, django_assert_num_queries,
+                                                     django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user=staff_user)
+        root, = make_chain(1)
+        book = Book.objects.get(pk=baker.make(Book, category=root, count=3).pk)
+        etag = api_client.get('/category/nested/')['ETag']
+
+        with django_capture_on_commit_callbacks(execute=True):
+            book.count = 1
+            book.save()
+        with django_assert_num_queries(1):
+            response = api_client.get('/category/nested/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        assert response.data[0]['available_total'] == 1
+
+    def test_if_category_filter_validates_against_cached_ids(self, api_client, user, django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        category = baker.make(Category)
+        baker.make(Book, category=category, _quantity=2)
+        baker.make(Book)
+        api_client.get('/user/search/', {'category': category.id})
+
+        # page count + books, no lookup of the category ids
+        with django_assert_num_queries(2):
+            response = api_client.get('/user/search/', {'category': category.id, 'page_size': 5})
+
+        assert response.data['count'] == 2
+        invalid = api_client.get('/user/search/', {'category': category.id + 100})
+        assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestCategoryDescendantsFilter:
+    def test_if_descendant_books_are_included_on_request(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        root, child, grandchild = make_chain(3)
+        books = [baker.make(Book, category=category) for category in (root, child, grandchild)]
+        baker.make(Book, category=baker.make(Category))
+
+        response = api_client.get('/user/search/', {'category': root.id, 'include_descendants': True})
+
+        assert {item['id'] for item in response.data['results']} == {book.id for book in books}
+
+    def test_if_only_direct_books_match_by_default(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        root, child = make_chain(2)
+        book = baker.make(Book, category=root)
+        baker.make(Book, category=child)
+
+        response = api_client.get('/user/search/', {'category': root.id})
+
+        assert [item['id'] for item in response.data['results']] == [book.id]
+
+
+@pytest.mark.django_db
+class TestCategoryTotals:
+    def totals(self, category):
+        category.refresh_from_db()
+        return category.book_total, category.available_total
+
+    def test_if_book_writes_roll_up_to_ancestors(self):
+        root, child = make_chain(2)
+        book = baker.make(Book, category=child, count=3)
+        baker.make(Book, category=root, count=0)
+
+        assert self.totals(root) == (2, 3)
+        assert self.totals(child) == (1, 3)
+
+        book.count = 1
+        book.save()
+        assert self.totals(root) == (2, 1)
+
+        book.delete()
+        assert self.totals(root) == (1, 0)
+        assert self.totals(child) == (0, 0)
+
+    def test_if_book_moving_category_moves_its_totals(self):
+        root, child = make_chain(2)
+        other = baker.make(Category)
+        book = baker.make(Book, category=child, count=2)
+
+        book = Book.objects.get(pk=book.pk)
+        book.category = other
+        book.save()
+
+        assert self.totals(root) == (0, 0)
+        assert self.totals(other) == (1, 2)
+
+    def test_if_category_moving_moves_subtree_totals(self):
+        root, child, grandchild = make_chain(3)
+        other = baker.make(Category)
+        baker.make(Book, category=grandchild, count=4)
+
+        child.parent = other
+        child.save()
+
+        assert self.totals(root) == (0, 0)
+        assert self.totals(other) == (1, 4)
+
+    def test_if_deleting_category_removes_subtree_from_ancestors(self):
+        root, child, grandchild = make_chain(3)
+        baker.make(Book, category=grandchild, count=4)
+
+        child.delete()
+
+        assert self.totals(root) == (0, 0)
+        assert self.totals(grandchild) == (1, 4)
+
+    def test_if_totals_are_exposed_in_tree(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        root, child = make_chain(2)
+        baker.make(Book, category=child, count=5)
+
+        response = api_client.get('/category/nested/')
+
+        assert response.data[0]['book_total'] == 1
+        assert response.data[0]['available_total'] == 5
+        assert response.data[0]['children'][0]['book_total'] == 1
+
+    def test_if_rebuild_restores_totals(self):
+        root, child = make_chain(2)
+        baker.make(Book, category=child, count=2)
+        Category.objects.update(book_total=0, available_total=0)
+
+        rebuild_category_totals()
+
+        assert self.totals(root) == (1, 2)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAtomicCategoryTotals:
+    def test_if_failed_rollup_leaves_the_book_in_place(self, monkeypatch):
+        root, other = baker.make(Category, _quantity=2)
+        book = Book.objects.get(pk=baker.make(Book, category=root, count=2).pk)
+        shifts = []
+
+        def shift_then_fail(category_id, books, copies):
+            if shifts:
+                raise RuntimeError
+            shifts.append(category_id)
+        monkeypatch.setattr(Category, 'shift_book_totals', staticmethod(shift_then_fail))
+        book.category = other
+        with pytest.raises(RuntimeError):
+            book.save()
+
+        assert Book.objects.get(pk=book.pk).category_id == root.id
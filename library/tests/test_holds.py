@@ -0,0 +1,173 @@
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from core.models import Profile
+from library import tasks
+from library.holds import BOOK_RESERVED, expire_offers, offer_copies, send_offer_sms
+from library.models import Book, BookHold, BorrowRequest, Notification
+
+
+@pytest.fixture(autouse=True)
+def sent_sms(monkeypatch):
+    sent = []
+    monkeypatch.setattr(tasks.send_bulk_sms_task, 'delay', lambda numbers, message: sent.append(numbers))
+    return sent
+
+
+@pytest.fixture
+def waiting_book():
+    book = baker.make(Book, count=0)
+    holds = [baker.make(BookHold, user=baker.make(Profile), book=book) for _ in range(3)]
+    return book, holds
+
+
+@pytest.fixture
+def restock(django_capture_on_commit_callbacks):
+    # Saving the book only queues offer_copies_task, so the offer is made here as the worker would
+    def restock_book(book, count=1):
+        book.count = count
+        book.save()
+        with django_capture_on_commit_callbacks(execute=True):
+            offer_copies(book.id)
+
+    return restock_book
+
+
+@pytest.mark.django_db
+class TestHoldQueue:
+    def test_if_restocked_copy_is_offered_to_oldest_hold(self, waiting_book, restock, sent_sms):
+        book, holds = waiting_book
+
+        restock(book)
+
+        statuses = [BookHold.objects.get(pk=hold.pk).status for hold in holds]
+        assert statuses == ['offered', 'waiting', 'waiting']
+        assert [BookHold.objects.get(pk=hold.pk).position for hold in holds] == [0, 1, 2]
+        assert sent_sms == [[holds[0].user.phone_number]]
+
+    def test_if_saving_book_only_queues_the_offer(self, waiting_book, monkeypatch,
+                                                  django_capture_on_commit_callbacks):
+        book, holds = waiting_book
+        queued = []
+        monkeypatch.setattr(tasks.offer_copies_task, 'delay', queued.append)
+        before = list(BookHold.objects.order_by('id').values_list('id', 'status', 'offered_at', 'offer_expires_at'))
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            book.count = 2
+            book.save()
+        unchanged = list(BookHold.objects.order_by('id').values_list('id', 'status', 'offered_at', 'offer_expires_at'))
+        for callback in callbacks:
+            callback()
+
+        assert unchanged == before
+        assert queued == [book.id]
+
+    def test_if_offers_are_texted_in_chunks(self, waiting_book, sent_sms, monkeypatch):
+        monkeypatch.setattr('library.holds.SMS_RECIPIENTS_PER_REQUEST', 2)
+        book, holds = waiting_book
+        Book.objects.filter(pk=book.pk).update(count=3)
+
+        assert offer_copies(book.id) == 3
+        offered_at = BookHold.objects.get(pk=holds[0].pk).offered_at
+        send_offer_sms(book.id, book.title, offered_at)
+
+        assert sorted(len(chunk) for chunk in sent_sms) == [1, 2]
+        assert sorted(number for chunk in sent_sms for number in chunk) == sorted(
+            hold.user.phone_number for hold in holds)
+
+    def test_if_reserved_copy_cannot_be_requested_by_others(self, api_client, waiting_book, restock):
+        book, holds = waiting_book
+        restock(book)
+
+        api_client.force_authenticate(user=holds[1].user)
+        refused = api_client.post(f'/user/books/{book.id}/borrow/', {'time': 14})
+        api_client.force_authenticate(user=holds[0].user)
+        claimed = api_client.post(f'/user/books/{book.id}/borrow/', {'time': 14})
+
+        assert refused.status_code == status.HTTP_400_BAD_REQUEST
+        assert BOOK_RESERVED in str(refused.data)
+        assert claimed.status_code == status.HTTP_201_CREATED
+
+    def test_if_accepted_borrow_fulfils_the_offer(self, api_client, staff_user, waiting_book, restock):
+        book, holds = waiting_book
+        restock(book)
+        borrow = baker.make(BorrowRequest, user=holds[0].user, book=book, type='borrow', time=14)
+
+        api_client.force_authenticate(user=staff_user)
+        api_client.put(f'/super-user/requests/{borrow.id}/', data={'status': 'accepted'})
+
+        assert BookHold.objects.get(pk=holds[0].pk).status == 'fulfilled'
+
+    def test_if_expired_offer_moves_to_next_hold(self, waiting_book, restock):
+        book, holds = waiting_book
+        restock(book)
+        BookHold.objects.filter(pk=holds[0].pk).update(offer_expires_at=timezone.now() - timezone.timedelta(hours=1))
+
+        assert expire_offers() == 1
+
+        statuses = [BookHold.objects.get(pk=hold.pk).status for hold in holds]
+        assert statuses == ['expired', 'offered', 'waiting']
+
+    def test_if_claimed_offer_does_not_expire(self, waiting_book, restock):
+        book, holds = waiting_book
+        restock(book)
+        BookHold.objects.filter(pk=holds[0].pk).update(offer_expires_at=timezone.now() - timezone.timedelta(hours=1))
+        baker.make(BorrowRequest, user=holds[0].user, book=book, type='borrow', time=14)
+
+        assert expire_offers() == 0
+
+    def test_if_user_can_join_and_see_queue_position(self, api_client, user, waiting_book):
+        book, holds = waiting_book
+        api_client.force_authenticate(user=user)
+
+        joined = api_client.post(f'/user/books/{book.id}/available/')
+        again = api_client.post(f'/user/books/{book.id}/available/')
+        response = api_client.get(f'/user/books/{book.id}/available/')
+
+        assert joined.data['position'] == 4
+        assert again.status_code == status.HTTP_400_BAD_REQUEST
+        assert (response.data['status'], response.data['position']) == ('waiting', 4)
+
+    def test_if_user_can_join_when_every_copy_is_offered(self, api_client, user, waiting_book, restock):
+        book, holds = waiting_book
+        restock(book, count=2)
+        api_client.force_authenticate(user=user)
+
+        joined = api_client.post(f'/user/books/{book.id}/available/')
+        refused = api_client.post(f'/user/books/{baker.make(Book, count=1).id}/available/')
+
+        assert joined.status_code == status.HTTP_201_CREATED
+        assert joined.data['position'] == 2
+        assert refused.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_old_subscriptions_are_queued_ahead(self, api_client, user):
+        book = baker.make(Book, count=0)
+        late, early = [baker.make(Notification, user=baker.make(Profile), book=book, type='available')
+                       for _ in range(2)]
+        Notification.objects.filter(pk=early.pk).update(created_at=timezone.now() - timezone.timedelta(days=1))
+        api_client.force_authenticate(user=user)
+
+        joined = api_client.post(f'/user/books/{book.id}/available/')
+
+        assert joined.data['position'] == 3
+        queue = BookHold.objects.filter(book=book, status='waiting').order_by('id').values_list('user_id', flat=True)
+        assert list(queue) == [early.user_id, late.user_id, user.id]
+        assert not Notification.objects.filter(type='available').exists()
+
+    def test_if_command_adopts_every_subscription(self, waiting_book):
+        book, holds = waiting_book
+        other_book = baker.make(Book, count=0)
+        newcomer = baker.make(Profile)
+        baker.make(Notification, user=holds[0].user, book=book, type='available')
+        baker.make(Notification, user=newcomer, book=book, type='available', _quantity=2)
+        baker.make(Notification, user=newcomer, book=other_book, type='available')
+
+        call_command('adopt_availability_subscriptions')
+
+        assert BookHold.objects.filter(book=book, status='waiting').count() == 4
+        assert BookHold.objects.get(book=book, user=newcomer).position == 4
+        assert BookHold.objects.filter(book=other_book, user=newcomer).exists()
+        assert not Notification.objects.filter(type='available').exists()
@@ -0,0 +1,70 @@
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from library.loans import resolve_loan_state
+from library.models import ActiveLoan, Book, BorrowRequest, ExtensionRequest, ReturnRequest
+
+
+@pytest.mark.django_db
+class TestResolveLoanState:
+    def test_if_state_counts_only_the_users_requests(self, user):
+        book = baker.make(Book)
+        borrow = baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='accepted')
+        baker.make(ActiveLoan, user=user, book=book, borrow_request=borrow, extended=True)
+        baker.make(ExtensionRequest, user=user, book=book, type='extension', time=3)
+        baker.make(ReturnRequest, book=book, type='return')
+
+        state = resolve_loan_state(user, book.id)
+
+        assert state == book
+        assert (state.pending_requests, state.pending_extensions, state.pending_returns) == (1, 1, 0)
+        assert state.loan_id and state.loan_extended
+
+    def test_if_state_without_loan_is_empty(self, user):
+        book = baker.make(Book)
+
+        state = resolve_loan_state(user, book.id)
+
+        assert (state.pending_requests, state.reviews, state.loan_id, state.loan_extended) == (0, 0, None, False)
+
+
+@pytest.mark.django_db
+class TestRequestCreationQueries:
+    def test_if_borrow_creation_resolves_state_in_one_query(self, api_client, user, django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+
+        # state + savepoint + base request insert + borrow request insert + release
+        with django_assert_num_queries(5):
+            response = api_client.post(f'/user/books/{book.id}/borrow/', data={'time': 14})
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_if_pending_request_constraint_maps_to_validation_error(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+        baker.make(ExtensionRequest, user=user, book=book, type='extension', time=3)
+
+        response = api_client.post(f'/user/books/{book.id}/borrow/', data={'time': 14})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data == ['! شما یک در خواست در حال بررسی دارید']
+        assert BorrowRequest.objects.count() == 0
+
+    def test_if_pending_request_blocks_extension(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book)
+        baker.make(ActiveLoan, user=user, book=book)
+        baker.make(ReturnRequest, user=user, book=book, type='return')
+
+        response = api_client.post(f'/user/books/{book.id}/extension/', data={'time': 3})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_if_unknown_book_returns_404(self, api_client, user):
+        api_client.force_authenticate(user=user)
+
+        response = api_client.post('/user/books/9999/return/', data={'score': 5})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
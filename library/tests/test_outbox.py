@@ -0,0 +1,50 @@
+from model_bakery import baker
+import pytest
+
+from core.models import Profile
+from library import tasks
+from library.models import Book, BorrowRequest, Notification, OutboxEvent, ReviewRequest
+from library.outbox import dispatch_outbox, emit, request_decided_event
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    def test_if_decision_writes_event_in_the_same_transaction(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        borrow = baker.make(BorrowRequest, user=baker.make(Profile), book=baker.make(Book, count=1), type='borrow',
+                            time=14)
+
+        api_client.put(f'/super-user/requests/{borrow.id}/', data={'status': 'rejected'})
+
+        event = OutboxEvent.objects.get()
+        assert event.processed_at is None
+        assert event.payload['request_id'] == borrow.id
+        assert event.payload['status'] == 'rejected'
+        assert not Notification.objects.exists()
+
+    def test_if_dispatch_applies_side_effects_once(self):
+        book = baker.make(Book, review_count=0, score_total=0, average_score=0)
+        reviews = [baker.make(ReviewRequest, user=baker.make(Profile), book=book, type='review', score=score,
+                              status='accepted') for score in (2, 5)]
+        emit([request_decided_event(review) for review in reviews])
+
+        assert dispatch_outbox(batch_size=1) == 2
+        assert dispatch_outbox() == 0
+
+        book.refresh_from_db()
+        assert (book.review_count, book.score_total, book.average_score) == (2, 7, 3.5)
+        assert Notification.objects.filter(type='request').count() == 2
+        assert not OutboxEvent.objects.filter(processed_at__isnull=True).exists()
+
+    def test_if_decision_sms_is_sent_after_commit(self, settings, monkeypatch, django_capture_on_commit_callbacks):
+        settings.REQUEST_DECISION_SMS = True
+        sent = []
+        monkeypatch.setattr(tasks.send_sms_task, 'delay', lambda *args: sent.append(args))
+        borrow = baker.make(BorrowRequest, user=baker.make(Profile, phone_number='09120000000'), type='borrow',
+                            status='rejected')
+        emit([request_decided_event(borrow)])
+
+        with django_capture_on_commit_callbacks(execute=True):
+            dispatch_outbox()
+
+        assert [phone_number for phone_number, message in sent] == ['09120000000']
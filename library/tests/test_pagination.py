@@ -0,0 +1,59 @@
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from library.models import Book, Notification
+
+
+@pytest.mark.django_db
+class TestCursorPagination:
+    def test_if_page_number_mode_is_default(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        baker.make(Book, _quantity=3)
+
+        response = api_client.get('/user/books/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 3
+
+    def test_if_cursor_mode_walks_all_notifications_newest_first(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        notifications = baker.make(Notification, user=user, title='title', _quantity=15)
+        expected = [notification.id for notification in sorted(
+            notifications, key=lambda notification: (notification.created_at, notification.id), reverse=True)]
+
+        first_page = api_client.get('/user/notifications/', {'pagination': 'cursor'})
+        second_page = api_client.get(first_page.data['next'])
+
+        assert 'count' not in first_page.data
+        assert second_page.data['next'] is None
+        ids = [item['id'] for item in first_page.data['results'] + second_page.data['results']]
+        assert ids == expected
+
+    def test_if_cursor_mode_works_on_admin_book_list(self, api_client, staff_user):
+        api_client.force_authenticate(user=staff_user)
+        books = baker.make(Book, _quantity=12)
+
+        first_page = api_client.get('/super-user/books/', {'pagination': 'cursor'})
+
+        assert len(first_page.data['results']) == 10
+        assert first_page.data['next'] is not None
+        assert {item['id'] for item in first_page.data['results']} <= {book.id for book in books}
+
+    def test_if_ranked_search_keeps_its_order_in_cursor_mode(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        in_title = baker.make(Book, title='Dune', description='')
+        in_description = baker.make(Book, title='Arrakis', description='dune')
+
+        response = api_client.get('/user/search/', {'search': 'dune', 'pagination': 'cursor'})
+
+        assert [item['id'] for item in response.data['results']] == [in_title.id, in_description.id]
+        assert response.data['count'] == 2
+
+    def test_if_filter_type_order_is_kept_in_cursor_mode(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        popular, other = baker.make(Book, borrow_count=5), baker.make(Book, borrow_count=1)
+
+        response = api_client.get('/user/search/', {'filter_type': 'popular', 'pagination': 'cursor'})
+
+        assert [item['id'] for item in response.data['results']] == [popular.id, other.id]
@@ -0,0 +1,98 @@
+from django.db import connection
+from django.utils import timezone
+from model_bakery import baker
+import pytest
+
+from core.models import Profile
+from library.filters import CustomBorrowHistoryFilter
+from library.loans import loan_state_queryset
+from library.models import ACTIVE_LOAN_CONSTRAINT, ActiveLoan, BaseRequestModel, Book, BookHold, BorrowRequest, \
+    Notification, ReviewRequest
+
+
+@pytest.fixture
+def seeded_data():
+    users = baker.make(Profile, _quantity=20)
+    books = baker.make(Book, count=1, _quantity=20)
+    now = timezone.now()
+    for index, user in enumerate(users):
+        book = books[index]
+        # Only a few loans are past their end date and only one offer has expired, as in production
+        borrow = baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='accepted',
+                            end_date=now + timezone.timedelta(days=index - 1))
+        baker.make(ActiveLoan, user=user, book=book, borrow_request=borrow)
+        baker.make(ReviewRequest, user=user, book=books[-index - 1], type='review', score=3, status='accepted')
+        baker.make(BaseRequestModel, user=users[index - 1], book=book, type='review', status='rejected',
+                   _quantity=10, _bulk_create=True)
+        baker.make(Notification, user=user, book=book, type='request', _quantity=50,
+                   _bulk_create=True)
+        baker.make(BookHold, user=user, book=books[-index - 1], status='waiting')
+        baker.make(BookHold, user=user, book=book, status='expired', _quantity=10, _bulk_create=True)
+        baker.make(BookHold, user=user, book=book, status='offered', offered_at=now,
+                   offer_expires_at=now + timezone.timedelta(hours=index - 1))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        # Tiny tables are cheaper to scan; forbid it so the plan shows whether an index can serve the query
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('SET LOCAL enable_bitmapscan = off')
+    return users, books
+
+
+def assert_uses_indexes(queryset, *index_names):
+    plan = queryset.explain()
+    assert 'Seq Scan' not in plan, plan
+    for index_name in index_names:
+        assert index_name in plan, plan
+
+
+@pytest.mark.django_db
+class TestHotQueryPlans:
+    def test_loan_state(self, seeded_data):
+        users, books = seeded_data
+        assert_uses_indexes(
+            loan_state_queryset(users[0]).filter(pk=books[0].pk),
+            'request_user_book_status_idx', 'hold_offered_book_idx',
+        )
+
+    def test_accepted_reviews_of_book(self, seeded_data):
+        users, books = seeded_data
+        assert_uses_indexes(
+            ReviewRequest.objects.filter(book=books[0], status='accepted').order_by('-created_at')[:10],
+            'request_book_status_idx',
+        )
+
+    def test_due_date_reminders(self, seeded_data):
+        assert_uses_indexes(
+            ActiveLoan.objects.filter(due__gte=timezone.now()).select_related('user', 'book'), 'active_loan_due_idx')
+
+    def test_borrow_history_by_return_date(self, seeded_data):
+        queryset = CustomBorrowHistoryFilter(
+            {'is_finished': True}, queryset=BorrowRequest.objects.filter(status='accepted'),
+        ).qs
+        assert_uses_indexes(queryset, 'borrow_end_date_idx')
+
+    def test_user_notifications(self, seeded_data):
+        users, books = seeded_data
+        assert_uses_indexes(Notification.objects.filter(user=users[0]).order_by('-created_at', '-id')[:10],
+                            'notif_user_created_at_idx')
+
+    def test_hold_queue(self, seeded_data):
+        users, books = seeded_data
+        assert_uses_indexes(BookHold.objects.filter(book=books[0], status='waiting').order_by('id')[:3],
+                            'hold_waiting_queue_idx')
+
+    def test_hold_queue_position(self, seeded_data):
+        users, books = seeded_data
+        hold = BookHold.objects.filter(status='waiting').first()
+        assert_uses_indexes(BookHold.objects.filter(book_id=hold.book_id, status='waiting', id__lte=hold.id),
+                            'hold_waiting_queue_idx')
+
+    def test_expired_hold_offers(self, seeded_data):
+        assert_uses_indexes(BookHold.objects.filter(status='offered', offer_expires_at__lt=timezone.now()),
+                            'hold_offer_expiry_idx')
+
+    def test_my_books(self, seeded_data):
+        users, books = seeded_data
+        assert_uses_indexes(ActiveLoan.objects.filter(user=users[0]).select_related('book', 'borrow_request'),
+                            ACTIVE_LOAN_CONSTRAINT)
+
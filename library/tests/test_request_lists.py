@@ -0,0 +1,52 @@
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from library.models import Book, BorrowRequest, ExtensionRequest, ReviewRequest, ReturnRequest
+
+
+def make_requests(user, book, quantity=3):
+    # Decided requests, since only one request per user and book may be pending
+    for _ in range(quantity):
+        baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='accepted')
+        baker.make(ExtensionRequest, user=user, book=book, type='extension', time=3, status='accepted')
+        baker.make(ReviewRequest, user=user, book=book, type='review', score=4, status='accepted')
+        baker.make(ReturnRequest, user=user, book=book, type='return', status='accepted')
+
+
+@pytest.mark.django_db
+class TestRequestListQueries:
+    def test_if_user_request_list_uses_constant_queries(self, api_client, user, django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        make_requests(user, baker.make(Book), quantity=1)
+
+        # page count + requests with books + one query per subtype
+        with django_assert_num_queries(6):
+            response = api_client.get('/user/requests/')
+
+        assert response.status_code == status.HTTP_200_OK
+        details = [item['request_detail'] for item in response.data['results']]
+        assert [detail['type'] for detail in details] == [
+            'borrow_request', 'extension_request', 'review_request', 'return']
+        assert details[2]['score'] == 4
+
+    def test_if_user_request_list_queries_do_not_grow_with_page(self, api_client, user,
+                                                                 django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        make_requests(user, baker.make(Book), quantity=2)
+
+        with django_assert_num_queries(6):
+            response = api_client.get('/user/requests/')
+
+        assert len(response.data['results']) == 8
+
+    def test_if_admin_request_list_uses_constant_queries(self, api_client, staff_user, user,
+                                                         django_assert_num_queries):
+        api_client.force_authenticate(user=staff_user)
+        make_requests(user, baker.make(Book), quantity=2)
+
+        with django_assert_num_queries(6):
+            response = api_client.get('/super-user/requests/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 8
@@ -0,0 +1,150 @@
+from django.contrib.postgres.search import SearchQuery
+from django.core.management import call_command
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from library.models import Book, Category
+
+
+@pytest.fixture
+def user_search_books(api_client):
+    def search_books(params):
+        return api_client.get('/user/search/', params)
+
+    return search_books
+
+
+@pytest.mark.django_db
+class TestFullTextSearch:
+    def test_if_search_matches_author_and_publisher(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+        by_author = baker.make(Book, title='کتاب اول', author='هوشنگ گلشیری', publisher='نیلوفر')
+        by_publisher = baker.make(Book, title='کتاب دوم', author='صادق هدایت', publisher='گلشیری')
+        baker.make(Book, title='کتاب سوم', author='سیمین دانشور', publisher='خوارزمی')
+
+        response = user_search_books({'search': 'گلشیری'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert {book['id'] for book in response.data['results']} == {by_author.id, by_publisher.id}
+
+    def test_if_title_matches_rank_above_description_matches(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+        in_description = baker.make(Book, title='سفر', description='داستانی درباره بوف کور')
+        in_title = baker.make(Book, title='بوف کور', description='رمان')
+
+        response = user_search_books({'search': 'بوف کور'})
+
+        assert [book['id'] for book in response.data['results']] == [in_title.id, in_description.id]
+
+    def test_if_search_matches_word_prefixes(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book, title='Dune Messiah')
+
+        response = user_search_books({'search': 'mess'})
+
+        assert [result['id'] for result in response.data['results']] == [book.id]
+
+    def test_if_rebuild_command_fills_missing_vectors(self):
+        book = baker.make(Book, title='Foundation')
+        Book.objects.update(search_vector=None)
+
+        call_command('rebuild_search_index')
+
+        assert not Book.objects.filter(id=book.id, search_vector__isnull=True).exists()
+
+    def test_if_vector_is_written_by_the_save_itself(self, django_assert_num_queries):
+        book = Book.objects.get(pk=baker.make(Book, title='Foundation', category=None).pk)
+        stored = Book.objects.filter(pk=book.pk, search_vector=SearchQuery('dune', config='simple'))
+
+        book.title = 'Dune'
+        with django_assert_num_queries(1):
+            book.save()
+        book.count += 1
+        with django_assert_num_queries(1) as restock:
+            book.save()
+
+        assert stored.exists()
+        assert 'search_vector' not in restock.captured_queries[0]['sql']
+
+    def test_if_arabic_spelling_and_zwnj_find_persian_title(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book, title='کتاب‌های کودکی', author='ی. کیانی')
+
+        response = user_search_books({'search': 'كتاب هاي'})
+
+        assert [result['id'] for result in response.data['results']] == [book.id]
+
+
+@pytest.mark.django_db
+class TestFuzzySearch:
+    def test_if_misspelled_title_is_found(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+        book = baker.make(Book, title='Foundation and Empire', author='Isaac Asimov')
+        baker.make(Book, title='Dune', author='Frank Herbert')
+
+        exact = user_search_books({'search': 'Fundation'})
+        fuzzy = user_search_books({'search': 'Fundation', 'fuzzy': True})
+
+        assert exact.data['results'] == []
+        assert [result['id'] for result in fuzzy.data['results']] == [book.id]
+
+    def test_if_results_are_ordered_by_similarity(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+        exact = baker.make(Book, title='بوف کور', author='صادق هدایت')
+        close = baker.make(Book, title='بوف کوچک', author='ناشناس')
+        baker.make(Book, title='کوری', author='ژوزه ساراماگو')
+
+        response = user_search_books({'search': 'بوف کور', 'fuzzy': True})
+
+        assert [result['id'] for result in response.data['results']] == [exact.id, close.id]
+
+
+@pytest.mark.django_db
+class TestSearchFacets:
+    def test_if_facets_are_returned_for_filtered_results(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+        novels, poems = baker.make(Category, _quantity=2)
+        baker.make(Book, title='رمان یک', category=novels, count=2, publication_year=1395, publisher='نیلوفر')
+        baker.make(Book, title='رمان دو', category=novels, count=0, publication_year=1401, publisher='نیلوفر')
+        baker.make(Book, title='شعر', category=poems, count=1, publication_year=1398, publisher='چشمه')
+
+        response = user_search_books({'search': 'رمان', 'facets': 1})
+
+        facets = response.data['facets']
+        assert facets['category'] == [{'id': novels.id, 'title': novels.title, 'count': 2}]
+        assert facets['availability'] == {'available': 1, 'unavailable': 1}
+        assert facets['publication_year'] == [
+            {'from': 1390, 'to': 1399, 'count': 1},
+            {'from': 1400, 'to': 1409, 'count': 1},
+        ]
+        assert facets['publisher'] == [{'value': 'نیلوفر', 'count': 2}]
+
+    def test_if_facets_cost_a_single_query(self, api_client, user, user_search_books, django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        baker.make(Book, _quantity=3)
+
+        with django_assert_num_queries(3):
+            # count, page of results, and one query for all the facets
+            user_search_books({'facets': 1})
+
+    def test_if_renamed_category_is_not_served_from_cache(self, api_client, user, user_search_books,
+                                                          django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user=user)
+        novels = baker.make(Category, title='رمان')
+        baker.make(Book, category=novels, _quantity=2)
+        user_search_books({'facets': 1})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            novels.title = 'داستان'
+            novels.save()
+        facets = user_search_books({'facets': 1}).data['facets']
+
+        assert facets['category'] == [{'id': novels.id, 'title': 'داستان', 'count': 2}]
+
+    def test_if_facets_are_omitted_by_default(self, api_client, user, user_search_books):
+        api_client.force_authenticate(user=user)
+
+        response = user_search_books({})
+
+        assert 'facets' not in response.data
@@ -0,0 +1,124 @@
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from library import tasks
+from library.models import Book
+from library.suggest import BookSuggester, rebuild_suggestions
+
+
+@pytest.fixture(autouse=True)
+def fresh_suggester(monkeypatch):
+    # Every test starts like a new process, without an index left over from the previous one
+    monkeypatch.setattr('library.views.book_suggester', BookSuggester())
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.rebuild_suggestions_task, 'delay', lambda: queued.append(True))
+    return queued
+
+
+@pytest.fixture
+def user_get_suggestions(api_client):
+    def get_suggestions(params):
+        return api_client.get('/user/search/suggest/', params)
+
+    return get_suggestions
+
+
+@pytest.mark.django_db
+class TestBookSuggestions:
+    def test_if_user_is_annonymous_returns_401(self, user_get_suggestions):
+        response = user_get_suggestions({'q': 'a'})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_if_title_and_author_prefixes_are_completed(self, api_client, user, user_get_suggestions):
+        api_client.force_authenticate(user=user)
+        baker.make(Book, title='بوف کور', author='صادق هدایت')
+        baker.make(Book, title='سه قطره خون', author='صادق هدایت')
+        baker.make(Book, title='سووشون', author='سیمین دانشور')
+
+        response = user_get_suggestions({'q': 'صاد'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == [{'type': 'author', 'value': 'صادق هدایت'}]
+
+    def test_if_query_is_normalized_and_matches_later_words(self, api_client, user, user_get_suggestions):
+        api_client.force_authenticate(user=user)
+        baker.make(Book, title='بوف کور', author='صادق هدایت')
+
+        response = user_get_suggestions({'q': 'كو'})
+
+        assert response.data == [{'type': 'title', 'value': 'بوف کور'}]
+
+    def test_if_new_book_is_suggested_once_the_rebuild_runs(self, api_client, user, user_get_suggestions, rebuilds,
+                                                          django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user=user)
+        user_get_suggestions({'q': 'dune'})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            baker.make(Book, title='Dune', author='Frank Herbert')
+        stale = user_get_suggestions({'q': 'du'})
+        user_get_suggestions({'q': 'fr'})
+        rebuild_suggestions()
+        response = user_get_suggestions({'q': 'du'})
+
+        assert stale.data == []
+        assert rebuilds == [True]
+        assert response.data == [{'type': 'title', 'value': 'Dune'}]
+
+    def test_if_title_change_does_not_rebuild_on_request(self, api_client, user, user_get_suggestions, rebuilds,
+                                                         django_capture_on_commit_callbacks,
+                                                         django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        book = Book.objects.get(pk=baker.make(Book, title='Dune', author='Frank Herbert').pk)
+        user_get_suggestions({'q': 'du'})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            book.title = 'Children of Dune'
+            book.save()
+        with django_assert_num_queries(0):
+            response = user_get_suggestions({'q': 'du'})
+
+        assert response.data == [{'type': 'title', 'value': 'Dune'}]
+        assert rebuilds == [True]
+
+    def test_if_new_process_serves_the_shared_index(self, api_client, user, user_get_suggestions, monkeypatch,
+                                                    django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        baker.make(Book, title='Dune', author='Frank Herbert')
+        user_get_suggestions({'q': 'du'})
+        monkeypatch.setattr('library.views.book_suggester', BookSuggester())
+
+        with django_assert_num_queries(0):
+            response = user_get_suggestions({'q': 'fr'})
+
+        assert response.data == [{'type': 'author', 'value': 'Frank Herbert'}]
+
+    def test_if_repeated_lookup_does_not_query_database(self, api_client, user, user_get_suggestions,
+                                                        django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        baker.make(Book, title='Dune', author='Frank Herbert')
+        user_get_suggestions({'q': 'du'})
+
+        with django_assert_num_queries(0):
+            response = user_get_suggestions({'q': 'fr'})
+
+        assert response.data == [{'type': 'author', 'value': 'Frank Herbert'}]
+
+    def test_if_inventory_change_keeps_the_index(self, api_client, user, user_get_suggestions,
+                                                 django_capture_on_commit_callbacks, django_assert_num_queries):
+        api_client.force_authenticate(user=user)
+        book = Book.objects.get(pk=baker.make(Book, title='Dune', author='Frank Herbert', count=2).pk)
+        user_get_suggestions({'q': 'du'})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            book.count -= 1
+            book.save()
+        with django_assert_num_queries(0):
+            response = user_get_suggestions({'q': 'fr'})
+
+        assert response.data == [{'type': 'author', 'value': 'Frank Herbert'}]
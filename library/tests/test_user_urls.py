@@ -3,7 +3,7 @@ from rest_framework import status
 import pytest
 from rest_framework.status import HTTP_401_UNAUTHORIZED
 
-from library.models import ReviewRequest, Book, BorrowRequest
+from library.models import ReviewRequest, Book, BorrowRequest, ActiveLoan
 
 
 @pytest.fixture
@@ -345,7 +345,8 @@ class TestPostCreateUserExtensionRequest:
         api_client.force_authenticate(user=user)
         book = baker.make(Book)
 
-        baker.make(BorrowRequest, user=user, book=book, time=3, status='accepted')
+        borrow = baker.make(BorrowRequest, user=user, book=book, time=3, status='accepted')
+        baker.make(ActiveLoan, user=user, book=book, borrow_request=borrow)
 
         data = {
             'user': user.id,
@@ -362,7 +363,8 @@ class TestPostCreateUserExtensionRequest:
         api_client.force_authenticate(user=user)
         book = baker.make(Book)
 
-        baker.make(BorrowRequest, user=user, book=book, time=14, status='accepted')
+        borrow = baker.make(BorrowRequest, user=user, book=book, time=14, status='accepted')
+        baker.make(ActiveLoan, user=user, book=book, borrow_request=borrow)
 
         data = {
             'user': user.id,
@@ -385,7 +387,8 @@ class TestPostCreateUserReturnRequest:
     def test_if_user_is_authenticated_returns_201(self, user, api_client, user_post_return_request):
         api_client.force_authenticate(user=user)
         book = baker.make(Book)
-        baker.make(BorrowRequest, user=user, book=book, time=14, status='accepted')
+        borrow = baker.make(BorrowRequest, user=user, book=book, time=14, status='accepted')
+        baker.make(ActiveLoan, user=user, book=book, borrow_request=borrow)
 
         post_data = {
             'book': book.id,
@@ -400,7 +403,8 @@ class TestPostCreateUserReturnRequest:
     def test_if_suer_is_authenticated_but_data_is_invalid_returns_400(self, user, api_client, user_post_return_request):
         api_client.force_authenticate(user=user)
         book = baker.make(Book)
-        baker.make(BorrowRequest, user=user, book=book, time=14, status='accepted')
+        borrow = baker.make(BorrowRequest, user=user, book=book, time=14, status='accepted')
+        baker.make(ActiveLoan, user=user, book=book, borrow_request=borrow)
 
         post_data = {
             'book': book.id,
@@ -0,0 +1,51 @@
+from model_bakery import baker
+from rest_framework.exceptions import ValidationError
+import pytest
+
+from core.models import Profile
+from library import workflow
+from library.models import ActiveLoan, Book, BorrowRequest, ReturnRequest
+from library.workflow import RETURN_CANNOT_BE_REJECTED, request_workflow
+
+
+@pytest.mark.django_db
+class TestRequestWorkflow:
+    def test_if_accepted_borrow_is_applied_on_the_loaded_row(self, django_assert_num_queries):
+        book = baker.make(Book, count=1)
+        borrow = baker.make(BorrowRequest, user=baker.make(Profile), book=book, type='borrow', time=30)
+        request = request_workflow.load(borrow.id)
+
+        # reservations, copy, loan, hold, request row (parent and child) and the outbox event
+        with django_assert_num_queries(7):
+            request_workflow.apply(request, 'accepted')
+
+        borrow.refresh_from_db()
+        assert (borrow.status, borrow.duration) == ('accepted', 30)
+        assert (borrow.end_date - borrow.start_date).days == 30
+        assert ActiveLoan.objects.filter(borrow_request=borrow).exists()
+
+    def test_if_unavailable_borrow_is_refused(self):
+        borrow = baker.make(BorrowRequest, book=baker.make(Book, count=0), type='borrow', time=14)
+
+        with pytest.raises(ValidationError):
+            request_workflow.apply(request_workflow.load(borrow.id), 'accepted')
+
+    def test_if_missing_transition_is_refused(self):
+        return_request = baker.make(ReturnRequest, type='return')
+
+        assert request_workflow.check(return_request, 'rejected') == RETURN_CANNOT_BE_REJECTED
+
+    def test_if_returned_copy_is_offered_after_commit(self, monkeypatch, django_capture_on_commit_callbacks):
+        announced = []
+        monkeypatch.setattr(workflow.offer_copies_task, 'delay', announced.append)
+        user = baker.make(Profile)
+        book = baker.make(Book, count=0)
+        baker.make(BorrowRequest, user=user, book=book, type='borrow', time=14, status='accepted')
+        return_request = baker.make(ReturnRequest, user=user, book=book, type='return')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            request_workflow.apply(request_workflow.load(return_request.id), 'accepted')
+            assert announced == []
+
+        assert announced == [book.id]
+        assert BorrowRequest.objects.get(user=user, book=book).is_finished
@@ -5,7 +5,8 @@ from library.views import HomePageAPIView, BookViewSet, SearchListAPIView, UserR
     UserReviewDetailView, DetailedBookView, RequestsListView, UserBorrowRequestView, AdminRequestView, \
     AdminSingleRequestView, AdminBookView, AdminSingleBookView, UserExtensionRequestView, UserReturnRequestView, \
     UserMyBookView, UserNotificationList, AdminNotificationView, AvailableRemainderView, \
-    BorrowHistoryView, BookReviewsForUser, CategoryViewSet
+    BorrowHistoryView, BookReviewsForUser, CategoryViewSet, BookSuggestView, \
+    AdminBulkRequestView
 
 router = DefaultRouter()
 router.register(r'category', CategoryViewSet, basename='category')
@@ -13,6 +14,7 @@ router.register(r'category', CategoryViewSet, basename='category')
 urlpatterns = [
     path('user/home/', HomePageAPIView.as_view(), name='home'),
     path('user/search/', SearchListAPIView.as_view(), name='search'),
+    path('user/search/suggest/', BookSuggestView.as_view(), name='search-suggest'),
     path('user/reviews/', UserReviewListView.as_view(), name='review-detail'),
     path('user/reviews/<int:pk>/', UserReviewDetailView.as_view(), name='review-detail'),
     path('user/books/', BookViewSet.as_view({'get': 'list'}), name='book-list'),
@@ -29,6 +31,7 @@ urlpatterns = [
     path('user/notifications/', UserNotificationList.as_view(), name='user-notifications'),
     # super user urls
     path('super-user/requests/', AdminRequestView.as_view(), name='admin-request'),
+    path('super-user/requests/bulk/', AdminBulkRequestView.as_view(), name='admin-bulk-request'),
     path('super-user/requests/<int:pk>/', AdminSingleRequestView.as_view(),
          name='admin-single-request'),
     path('super-user/books/', AdminBookView.as_view(), name='admin-book'),
@@ -1,29 +1,33 @@
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
-from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
 
-from .models import BorrowRequest, Book, Notification
-from .tasks import send_sms_task
+from .models import ActiveLoan, PENDING_REQUEST_CONSTRAINT
 
 
 def calculate_end_date(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
-    user = request.user
+    due = ActiveLoan.objects.filter(user=request.user, book_id=book_id).values_list('due', flat=True).first()
+    if due is None:
+        return None
+    return (due - timezone.now()).days
+
 
+@contextmanager
+def pending_request_guard():
+    """
+    Inserts a request optimistically and turns a violation of the one-pending-request-per-book
+    constraint into the usual validation error, instead of checking for pending requests first.
+    """
     try:
-        borrow_request = BorrowRequest.objects.get(user=user, book=book, is_finished=False)
-
-        end_date = borrow_request.end_date
-
-        # Check if end_date is None
-        if end_date is not None:
-            today = timezone.now()
-            remaining_days = (end_date - today).days
-            return remaining_days
-        else:
-            return None  # or some appropriate message indicating end_date is not set
-    except BorrowRequest.DoesNotExist:
-        return None
+        with transaction.atomic():
+            yield
+    except IntegrityError as error:
+        if getattr(getattr(error.__cause__, 'diag', None), 'constraint_name', None) == PENDING_REQUEST_CONSTRAINT:
+            raise ValidationError("! شما یک در خواست در حال بررسی دارید")
+        raise
 
 
 # def calculate_end_date(request, book_id):
@@ -49,14 +53,3 @@ def calculate_end_date(request, book_id):
 #     except BorrowRequest.DoesNotExist:
 #         return {"message": "!این کتاب را تا به حال به امانت نبرده اید"}
 
-
-def handle_availability(book_id):
-    book = get_object_or_404(Book, id=book_id)
-
-    available_notifications = Notification.objects.filter(book=book, type='available')
-    for notification in available_notifications:
-        user_profile = notification.user
-        if user_profile and user_profile.phone_number:
-            message = f"سلام {user_profile} عزیز, کتاب {book.title} موجود شد"
-            send_sms_task.delay(user_profile.phone_number, message)
-            available_notifications.delete()
@@ -1,5 +1,5 @@
-from django.db.models import Count, Q
-from django.utils import timezone
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics
@@ -7,7 +7,6 @@ from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.filters import SearchFilter
 from rest_framework.generics import DestroyAPIView, UpdateAPIView, RetrieveAPIView, CreateAPIView, \
     get_object_or_404, ListAPIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
@@ -19,15 +18,25 @@ from library.serializers.book_serializers import FullBookSerializer, SingleBookU
 from library.serializers.category_serializers import CategorySerializer, SimpleCategoryListSerializer, \
     SingleCategorySerializer
 from library.serializers.home_page_serializers import BookSerializer, BookSerializerForAdmin, \
-    BookListSerializerForAdmin, BookAvailableRemainderSerializer
-from .models import Book, Category, ReviewRequest, BorrowRequest, ExtensionRequest, BaseRequestModel, Notification, \
-    ReturnRequest
+    BookListSerializerForAdmin, BookAvailableRemainderSerializer, BookHoldSerializer, HOLD_ALREADY_EXISTS
+from .models import Book, Category, ReviewRequest, BorrowRequest, BaseRequestModel, Notification, ActiveLoan, \
+    BookHold
 from .serializers.Request_serializers import UserRequestSerializer, \
-    UserBorrowRequestSerializer, UserExtensionRequestSerializer, UserReturnRequestSerializer, BaseRequestSerializer
-from .serializers.admin_serializers import AdminRequestSerializer, AdminNotificationSerializer, BorrowHistorySerializer
+    UserBorrowRequestSerializer, UserExtensionRequestSerializer, UserReturnRequestSerializer, BaseRequestSerializer, \
+    ActiveLoanSerializer
+from .serializers.admin_serializers import AdminRequestSerializer, AdminNotificationSerializer, BorrowHistorySerializer, \
+    BulkRequestDecisionListSerializer
 from .serializers.notif_serializerss import UserNotificationSerializer
 from .serializers.review_serializers import DetailedReviewSerializer, ReviewsSerializerForBooks
 from .serializers.user_serializers import UserCreateReviewSerializer
+from .bulk_requests import apply_request_decisions
+from .caching import cache_response, idempotent
+from .facets import get_book_facets
+from .holds import adopt_subscriptions, free_copies
+from .category_cache import category_tree
+from .suggest import book_suggester, SUGGESTION_LIMIT
+from .utils import pending_request_guard
+from .workflow import request_workflow
 
 
 class CategoryView(ListAPIView):
@@ -43,6 +52,12 @@ class CategoryView(ListAPIView):
             queryset = queryset.filter(parent__isnull=True)
         return queryset.prefetch_related('children')
 
+    def list(self, request, *args, **kwargs):
+        if 'parent' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(category_tree.tree())
+        return self.get_paginated_response(page)
+
 
 class SimpleCategoryList(ListAPIView):
     permission_classes = [IsAuthenticated]
@@ -66,6 +81,10 @@ class BookViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated]
 
+    @cache_response('books')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class DetailedBookView(RetrieveAPIView):
     queryset = Book.objects.all()
@@ -76,21 +95,15 @@ class DetailedBookView(RetrieveAPIView):
 class HomePageAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @staticmethod
-    def get(request, *args, **kwargs):
+    @cache_response('home')
+    def get(self, request, *args, **kwargs):
         newest_books = Book.objects.order_by('-created_at')[:10]
         newest_books_data = BookSerializer(newest_books, many=True).data
 
-        most_popular_books = Book.objects.annotate(
-            borrow_requests_count=Count('requests', filter=Q(
-                requests__borrowrequest__isnull=False)),
-        ).order_by('-borrow_requests_count', )[:10]
+        most_popular_books = Book.objects.order_by('-borrow_count')[:10]
         most_popular_books_data = BookSerializer(
             most_popular_books, many=True).data
-        most_reviewed_books = Book.objects.annotate(
-            review_requests_count=Count('requests', filter=Q(
-                requests__reviewrequest__isnull=False)),
-        ).order_by('-review_requests_count')[:10]
+        most_reviewed_books = Book.objects.order_by('-review_count')[:10]
         most_reviewed_books_data = BookSerializer(
             most_reviewed_books, many=True).data
 
@@ -105,12 +118,29 @@ class HomePageAPIView(APIView):
 
 class SearchListAPIView(ListAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = Book.objects.all()
+    queryset = Book.objects.select_related('category').defer('search_vector').order_by('id')
     serializer_class = FullBookSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    filter_backends = (DjangoFilterBackend,)
     filterset_class = CustomBookFilterSet
-    filterset_fields = ['category']
-    search_fields = ['title']
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true', 'True'):
+            response.data['facets'] = get_book_facets(request, self.filter_queryset(self.get_queryset()))
+        return response
+
+
+class BookSuggestView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_limit = 20
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', SUGGESTION_LIMIT)), self.max_limit)
+        except ValueError:
+            raise ValidationError({'limit': '! تعداد پیشنهادها باید عدد باشد'})
+        suggestions = book_suggester.suggest(request.query_params.get('q', ''), limit=limit)
+        return Response(suggestions, status=status.HTTP_200_OK)
 
 
 class UserReviewListView(generics.ListAPIView):
@@ -147,10 +177,11 @@ class UserReviewDetailView(generics.RetrieveAPIView, generics.DestroyAPIView, ge
 class RequestsListView(generics.ListAPIView):
     serializer_class = UserRequestSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('created_at', 'id')
 
     def get_queryset(self):
         user = self.request.user
-        queryset = BaseRequestModel.objects.filter(user=user)
+        queryset = BaseRequestModel.objects.select_related('book').filter(user=user)
         return queryset.order_by('created_at')
 
 
@@ -160,22 +191,14 @@ class UserBorrowRequestView(CreateAPIView):
     queryset = BaseRequestModel.objects.all()
 
     def perform_create(self, serializer):
-        book_id = self.kwargs.get('pk')
-        book = get_object_or_404(Book, pk=book_id)
-        has_pending_request = BaseRequestModel.objects.filter(
-            user=self.request.user,
-            book=book,
-            status='pending'
-        ).exists()
-        if has_pending_request:
-            raise ValidationError("! شما یک در خواست در حال بررسی دارید")
-        serializer.save(
-            book=book,
-            user=self.request.user,
-            status='pending',
-            type='borrow'
-        )
-
+        with pending_request_guard():
+            serializer.save(
+                user=self.request.user,
+                status='pending',
+                type='borrow'
+            )
+
+    @idempotent()
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
 
@@ -191,22 +214,14 @@ class UserExtensionRequestView(CreateAPIView):
     queryset = BaseRequestModel.objects.all()
 
     def perform_create(self, serializer):
-        book_id = self.kwargs.get('pk')
-        book = get_object_or_404(Book, pk=book_id)
-        has_pending_request = BaseRequestModel.objects.filter(
-            user=self.request.user,
-            book=book,
-            status='pending'
-        ).exists()
-        if has_pending_request:
-            raise ValidationError("! شما یک درخواست در حال بررسی دارید")
-        serializer.save(
-            book=book,
-            user=self.request.user,
-            status='pending',
-            type='extension'
-        )
-
+        with pending_request_guard():
+            serializer.save(
+                user=self.request.user,
+                status='pending',
+                type='extension'
+            )
+
+    @idempotent()
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
 
@@ -222,27 +237,27 @@ class UserReturnRequestView(CreateAPIView):
     queryset = BaseRequestModel.objects.all()
 
     def perform_create(self, serializer):
-        book_id = self.kwargs.get('pk')
-        book = get_object_or_404(Book, pk=book_id)
+        book = serializer.validated_data['book']
         score = serializer.validated_data.pop('score', None)
         description = serializer.validated_data.pop('description', None)
 
-        ReviewRequest.objects.create(
-            score=score,
-            description=description,
-            user=self.request.user,
-            type='review',
-            book=book,
-            status='pending'
-        )
-
-        serializer.save(
-            book=book,
-            user=self.request.user,
-            status='pending',
-            type='return'
-        )
-
+        with pending_request_guard():
+            ReviewRequest.objects.create(
+                score=score,
+                description=description,
+                user=self.request.user,
+                type='review',
+                book=book,
+                status='pending'
+            )
+
+            serializer.save(
+                user=self.request.user,
+                status='pending',
+                type='return'
+            )
+
+    @idempotent()
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
 
@@ -258,8 +273,7 @@ class AdminRequestView(ListAPIView):
     search_fields = ['status']
 
     def get_queryset(self):
-        queryset = BaseRequestModel.objects.select_related('user', 'book', 'borrowrequest', 'extensionrequest',
-                                                           'returnrequest', 'reviewrequest').all()
+        queryset = BaseRequestModel.objects.select_related('user', 'book').all()
         return queryset.order_by('-created_at')
 
 
@@ -270,72 +284,31 @@ class AdminSingleRequestView(RetrieveAPIView, UpdateAPIView):
     def get_queryset(self):
         return BaseRequestModel.objects.all()
 
+    def get_object(self):
+        if self.request.method not in ('PUT', 'PATCH'):
+            return super().get_object()
+        # Decisions lock the request and load its subtype once for the whole transition
+        request = request_workflow.load(self.kwargs['pk'])
+        self.check_object_permissions(self.request, request)
+        return request
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
     def perform_update(self, serializer):
-        instance = serializer.save()
-
-        if instance.status not in ['accepted', 'rejected']:
-            return
-
-        if instance.status == 'accepted':
-            self.handle_request(instance)
-        elif instance.status == 'rejected':
-            self.handle_rejection(instance)
-        # self.send_sms_notification(instance)
-        self.create_notification(instance)
-
-    def handle_request(self, request):
-        if request.type == 'borrow':
-            self.handle_borrow_request(request)
-        elif request.type == 'extension':
-            self.handle_extension_request(request)
-        elif request.type == 'return':
-            self.handle_return_request(request)
-
-    def handle_borrow_request(self, request):
-        book = Book.objects.filter(id=request.book_id).first()
-        if book and book.count > 0:
-            borrow_request = BorrowRequest.objects.get(id=request.id)
-            borrow_request.calculate_duration(self.request)
-            book.count -= 1
-            book.save()
-        else:
-            borrow_request = BorrowRequest.objects.get(id=request.id)
-            borrow_request.status = 'pending'
-            borrow_request.save()
-            raise ValidationError(
-                "نسخه ای از این کتاب در حال حاظر موجود نمی باشد")
-
-    def handle_extension_request(self, request):
-        extension_request = ExtensionRequest.objects.get(id=request.id)
-        extension_request.extend_duration(self.request)
-
-    def handle_return_request(self, request):
-        return_request = ReturnRequest.objects.get(id=request.id)
-        user = return_request.user
-        book = return_request.book
-        book.count += 1
-        book.save()
-        borrow_request = BorrowRequest.objects.filter(
-            user=user, book=book).last()
-        borrow_request.end_date = timezone.now()
-        borrow_request.is_finished = True
-        borrow_request.save()
-
-    def handle_rejection(self, request):
-        # I added here for myself, it's not important
-        pass
-
-    def create_notification(self, request):
-        title = f"درخواست {request.type} شما توسط ادمین {request.status}"
-        description = f"درخواست {request.type} شما برای کتاب {request.book.title} توسط ادمین {request.status}"
-
-        Notification.objects.create(
-            user=request.user,
-            book=request.book,
-            title=title,
-            description=description,
-            type='request'
-        )
+        request_workflow.apply(serializer.instance, serializer.validated_data.get('status', serializer.instance.status))
+
+
+class AdminBulkRequestView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkRequestDecisionListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        decisions = {item['id']: item['status'] for item in serializer.validated_data['items']}
+        results = apply_request_decisions(decisions)
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
 
 class AdminBookView(ListAPIView, CreateAPIView):
@@ -344,8 +317,7 @@ class AdminBookView(ListAPIView, CreateAPIView):
     search_fields = ['title']
 
     def get_queryset(self):
-        queryset = Book.objects.select_related(
-            'category__parent__parent').all()
+        queryset = Book.objects.select_related('category').all()
         return queryset.order_by('-created_at')
 
 
@@ -358,11 +330,12 @@ class AdminSingleBookView(RetrieveAPIView, UpdateAPIView, DestroyAPIView):
 
 
 class UserMyBookView(ListAPIView):
-    serializer_class = BaseRequestSerializer
+    serializer_class = ActiveLoanSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return BaseRequestModel.objects.filter(user=self.request.user, status='accepted', type='borrow')
+        return ActiveLoan.objects.filter(user=self.request.user).select_related(
+            'book', 'borrow_request').order_by('due', 'id')
 
 
 class UserNotificationList(ListAPIView):
@@ -404,10 +377,7 @@ class UserReviewView(CreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        book_id = self.kwargs.get('pk')
-        book = get_object_or_404(Book, pk=book_id)
         serializer.save(
-            book=book,
             user=self.request.user,
             status='pending',
             type='review'
@@ -430,25 +400,36 @@ class AvailableRemainderView(CreateAPIView):
         book_id = self.kwargs.get('pk')
         book = get_object_or_404(Book, pk=book_id)
 
-        if book.count > 0:
+        # Subscribers from before the hold queue go ahead of this user
+        adopt_subscriptions(book.id)
+        # Copies already kept for the queue are not available to this user either
+        if free_copies(book) > 0:
             raise ValidationError({"message": "!موجودی کتاب هنوز صفر نشده"})
 
-        serializer.save(
-            book=book,
-            user=self.request.user,
-            type='available',
-        )
+        try:
+            with transaction.atomic():
+                serializer.save(book=book, user=self.request.user)
+        except IntegrityError:
+            # A concurrent request queued the same user first; the partial unique index kept one hold
+            raise ValidationError(HOLD_ALREADY_EXISTS)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             self.perform_create(serializer)
             response_data = {
-                'message': ".درخواست موجود شد به من اطلاع بده با موفقیت ایجاد شد"
+                'message': ".درخواست موجود شد به من اطلاع بده با موفقیت ایجاد شد",
+                'position': serializer.instance.position,
             }
             return Response(response_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def get(self, request, *args, **kwargs):
+        adopt_subscriptions(self.kwargs.get('pk'))
+        hold = get_object_or_404(BookHold, user=request.user, book_id=self.kwargs.get('pk'),
+                                 status__in=BookHold.ACTIVE_STATUSES)
+        return Response(BookHoldSerializer(hold).data, status=status.HTTP_200_OK)
+
 
 class BorrowHistoryView(ListAPIView):
     serializer_class = BorrowHistorySerializer
@@ -469,6 +450,10 @@ class BookReviewsForUser(ListAPIView):
         book_id = self.kwargs.get('pk')
         return ReviewRequest.objects.filter(book_id=book_id, status='accepted').order_by('-created_at')
 
+    @cache_response('book:{pk}')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
@@ -486,6 +471,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='nested')
     def nested(self, request):
-        categories = Category.objects.filter(parent=None)
-        serializer = self.get_serializer(categories, many=True)
-        return Response(serializer.data)
+        etag = category_tree.etag()
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(category_tree.tree(), headers={'ETag': etag})
@@ -0,0 +1,145 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from library.counters import borrow_copy, return_copy
+from library.holds import check_reservation, fulfil_holds
+from library.loaders import REQUEST_SUBTYPES, load_request_subtypes
+from library.loans import close_loans, extend_loans, loan_pairs, open_loans
+from library.models import BaseRequestModel, BorrowRequest
+from library.outbox import emit, request_decided_event
+from library.tasks import offer_copies_task
+
+REQUEST_ALREADY_DECIDED = '! شما یک بار وضعیت در خواست را رد و یا تایید کردید و دیگر این امکان برای شما فراهم نیست'
+RETURN_CANNOT_BE_REJECTED = '!وضعیت برای درخواست تحویل امکان رد شدن ندارد'
+TRANSITION_NOT_ALLOWED = '! تغییر وضعیت این درخواست امکان پذیر نیست'
+BOOK_UNAVAILABLE = 'نسخه ای از این کتاب در حال حاظر موجود نمی باشد'
+
+
+class Transition:
+    """
+    One edge of the request state machine. Guards return an error message to refuse the move,
+    effects run inside the caller's transaction on the loaded subtype row and may change the
+    listed `fields`, and `after_commit` hooks are queued with transaction.on_commit.
+    """
+
+    def __init__(self, guards=(), effects=(), fields=(), after_commit=()):
+        self.guards = guards
+        self.effects = effects
+        self.fields = fields
+        self.after_commit = after_commit
+
+
+def take_copy(borrow):
+    # The conditional UPDATE is the availability check, so it runs as an effect and aborts the move
+    if not borrow_copy(borrow.book_id, borrow.book.category_id):
+        raise ValidationError(BOOK_UNAVAILABLE)
+
+
+def start_borrow(borrow):
+    now = timezone.now()
+    borrow.duration = borrow.time
+    borrow.start_date = now
+    borrow.end_date = now + timezone.timedelta(days=borrow.time)
+
+
+def start_loan(borrow):
+    open_loans([borrow])
+    fulfil_holds([borrow])
+
+
+def copy_not_reserved(borrow):
+    return check_reservation(borrow.book, borrow.user_id)
+
+
+def extend_borrow(extension):
+    extension.duration = extension.time
+    extend_loans([extension])
+
+
+def restock_copy(return_request):
+    return_copy(return_request.book_id, return_request.book.category_id)
+
+
+def finish_borrow(return_request):
+    BorrowRequest.objects.filter(loan_pairs([return_request]), is_finished=False).update(
+        end_date=timezone.now(), is_finished=True)
+    close_loans([return_request])
+
+
+def offer_returned_copy(return_request):
+    offer_copies_task.delay(return_request.book_id)
+
+
+class RequestWorkflow:
+    """
+    Moves requests between statuses following a (type, target status) transition table. The
+    request is loaded and locked once together with its subtype row, and every guard and effect
+    works on that instance instead of fetching the row again.
+    """
+
+    def __init__(self, transitions, refusals=None):
+        self.transitions = transitions
+        self.refusals = refusals or {}
+
+    def load(self, request_id):
+        request = get_object_or_404(
+            BaseRequestModel.objects.select_for_update(of=('self',)).select_related('user', 'book'), pk=request_id)
+        load_request_subtypes([request])
+        return request
+
+    def check(self, request, status):
+        if request.status != 'pending':
+            return REQUEST_ALREADY_DECIDED
+        if status != request.status and (request.type, status) not in self.transitions:
+            return self.refusals.get((request.type, status), TRANSITION_NOT_ALLOWED)
+        return None
+
+    def apply(self, request, status):
+        """
+        Runs the transition to `status` on a request returned by `load`, within the same transaction.
+        Staying in the current status is a no-op.
+        """
+        error = self.check(request, status)
+        if error:
+            raise ValidationError(error)
+        if status == request.status:
+            return request
+
+        transition = self.transitions[request.type, status]
+        subtype = getattr(request, REQUEST_SUBTYPES[request.type]._meta.model_name)
+        subtype.user, subtype.book = request.user, request.book
+        for guard in transition.guards:
+            error = guard(subtype)
+            if error:
+                raise ValidationError(error)
+
+        request.status = subtype.status = status
+        for effect in transition.effects:
+            effect(subtype)
+        subtype.save(update_fields=['status', 'updated_at', *transition.fields])
+
+        # Notifications, texts and review counters are applied by the outbox dispatcher
+        emit([request_decided_event(request)])
+        for hook in transition.after_commit:
+            transaction.on_commit(lambda hook=hook: hook(subtype))
+        return request
+
+
+request_workflow = RequestWorkflow(
+    transitions={
+        ('borrow', 'accepted'): Transition(
+            guards=[copy_not_reserved], effects=[take_copy, start_borrow, start_loan], fields=['duration', 'start_date', 'end_date']),
+        ('borrow', 'rejected'): Transition(),
+        ('extension', 'accepted'): Transition(effects=[extend_borrow], fields=['duration']),
+        ('extension', 'rejected'): Transition(),
+        ('return', 'accepted'): Transition(
+            effects=[restock_copy, finish_borrow], after_commit=[offer_returned_copy]),
+        ('review', 'accepted'): Transition(),
+        ('review', 'rejected'): Transition(),
+    },
+    refusals={
+        ('return', 'rejected'): RETURN_CANNOT_BE_REJECTED,
+    },
+)